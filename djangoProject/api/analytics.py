@@ -0,0 +1,237 @@
+"""
+Token holder distribution reports. Balances are uint256 wei amounts, which
+neither float64 nor int64 can hold exactly, so each one is split into
+nine uint64 limbs of nine decimal digits. Sorting and sums run on the
+limbs in NumPy and are exact; only the Gini coefficient and the shares
+are computed in floating point.
+"""
+
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+from .balances import latest_block_number
+from .models import CustomUser, IndexerCheckpoint, TokenBalance
+from .provider import rpc_batch
+from .renderers import format_wei
+from .singleflight import single_flight
+from .transactions import encode_call
+from .utils import CONTRACT_ADDRESS
+
+WEI_PER_ETHER = 10**18
+LIMB = 10**9
+# Enough base-10**9 digits for any uint256.
+LIMBS = 9
+
+# (label, first percentile, last percentile) of holders ordered by balance.
+BUCKETS = (
+    ("bottom 50%", 0, 50),
+    ("50-90%", 50, 90),
+    ("90-99%", 90, 99),
+    ("top 1%", 99, 100),
+)
+PERCENTILES = (10, 25, 50, 75, 90, 99)
+
+_reports = {}
+_lock = threading.Lock()
+
+
+def report_block():
+    """
+    Returns (source, block_number) for the balances a report would use:
+    the event indexer's tables when BALANCE_SOURCE is "index" and it has
+    run, the node at the latest block otherwise.
+    """
+    if settings.BALANCE_SOURCE == "index":
+        checkpoint = IndexerCheckpoint.objects.filter(
+            name=IndexerCheckpoint.VIRTUAL_CURRENCY, block_number__gte=0
+        ).first()
+        if checkpoint is not None:
+            return "index", checkpoint.block_number
+    return "rpc", latest_block_number()
+
+
+def load_balances(source, block_number):
+    """
+    Returns the holder addresses and their VC balances in wei. From the
+    node this is one balanceOf call per user wallet, sent in batches.
+    """
+    if source == "index":
+        rows = list(TokenBalance.objects.values_list("address", "balance"))
+        return [address for address, _ in rows], [balance for _, balance in rows]
+    addresses = list(
+        CustomUser.objects.order_by("id").values_list("wallet_address", flat=True)
+    )
+    block = hex(block_number)
+    results = rpc_batch(
+        [
+            (
+                "eth_call",
+                [
+                    {
+                        "to": CONTRACT_ADDRESS,
+                        "data": encode_call("balanceOf", [address]),
+                    },
+                    block,
+                ],
+            )
+            for address in addresses
+        ],
+        block_number,
+    )
+    return addresses, [int(result, 16) for result in results]
+
+
+def total_supply(block_number):
+    [result] = rpc_batch(
+        [
+            (
+                "eth_call",
+                [
+                    {"to": CONTRACT_ADDRESS, "data": encode_call("totalSupply", [])},
+                    hex(block_number),
+                ],
+            )
+        ],
+        block_number,
+    )
+    return int(result, 16)
+
+
+def to_limbs(balances):
+    """
+    Splits wei amounts into a (LIMBS, n) uint64 array of base-10**9
+    digits, least significant first.
+    """
+    values = np.array(balances, dtype=object)
+    limbs = np.empty((LIMBS, len(balances)), dtype=np.uint64)
+    for row in range(LIMBS):
+        limbs[row] = values % LIMB
+        values //= LIMB
+    return limbs
+
+
+def from_limbs(limbs):
+    return sum(int(limb) * LIMB**row for row, limb in enumerate(limbs))
+
+
+def distribution(addresses, balances, top):
+    """
+    Computes the holder aggregates over the non-zero balances. Every
+    amount is exact; cumulative limb sums stay within uint64 for up to
+    1.8e10 holders.
+    """
+    limbs = to_limbs(balances)
+    held = limbs.any(axis=0)
+    addresses = np.array(addresses, dtype=object)[held]
+    limbs = limbs[:, held]
+    holders = limbs.shape[1]
+    if not holders:
+        return {
+            "holders": 0,
+            "sum_of_balances": "0",
+            "gini": None,
+            "percentiles": {},
+            "buckets": [],
+            "top_holders": [],
+        }
+
+    # lexsort orders by the last row first, the most significant limb.
+    order = np.lexsort(limbs)
+    limbs, addresses = limbs[:, order], addresses[order]
+    cumulative = np.cumsum(limbs, axis=1)
+
+    def range_sum(start, end):
+        """Exact sum of the sorted balances in [start, end)."""
+        if end <= start:
+            return 0
+        total = from_limbs(cumulative[:, end - 1])
+        if start:
+            total -= from_limbs(cumulative[:, start - 1])
+        return total
+
+    def balance_at(index):
+        return from_limbs(limbs[:, index])
+
+    total = range_sum(0, holders)
+    # Ascending order makes the Gini coefficient a weighted rank sum.
+    scale = float(LIMB) ** np.arange(LIMBS) / WEI_PER_ETHER
+    values = scale @ limbs.astype(np.float64)
+    ranks = np.arange(1, holders + 1, dtype=np.float64)
+    gini = (
+        2 * np.dot(ranks, values) / (holders * values.sum()) - (holders + 1) / holders
+    )
+
+    buckets = []
+    for label, first, last in BUCKETS:
+        start, end = holders * first // 100, holders * last // 100
+        amount = range_sum(start, end)
+        buckets.append(
+            {
+                "range": label,
+                "holders": end - start,
+                "balance": format_wei(amount),
+                "share": round(amount / total, 6),
+            }
+        )
+
+    return {
+        "holders": holders,
+        "sum_of_balances": format_wei(total),
+        "gini": round(float(gini), 6),
+        "percentiles": {
+            # Nearest rank: the smallest balance with q% of holders at or below it.
+            f"p{q}": format_wei(balance_at(-(-holders * q // 100) - 1))
+            for q in PERCENTILES
+        },
+        "buckets": buckets,
+        "top_holders": [
+            {
+                "address": addresses[i],
+                "balance": format_wei(balance_at(i)),
+            }
+            for i in range(holders - 1, max(holders - top, 0) - 1, -1)
+        ],
+    }
+
+
+def build_report(source, block_number, top):
+    started = time.perf_counter()
+    addresses, balances = load_balances(source, block_number)
+    supply = total_supply(block_number)
+    loaded = time.perf_counter()
+    report = distribution(addresses, balances, top)
+    computed = time.perf_counter()
+    return {
+        "block_number": block_number,
+        "source": source,
+        "accounts": len(addresses),
+        "total_supply": format_wei(supply),
+        # Held by addresses outside the report, e.g. the central account
+        # when reading user wallets from the node.
+        "supply_outside_accounts": format_wei(supply - sum(balances)),
+        **report,
+        "load_seconds": round(loaded - started, 4),
+        "compute_seconds": round(computed - loaded, 4),
+    }
+
+
+def holder_report(top=10):
+    """
+    Returns the holder report for the current block, computing it at most
+    once per block and `top` however many requests ask at the same time.
+    """
+    source, block_number = report_block()
+    key = (source, block_number, top)
+    with _lock:
+        report = _reports.get(key)
+    if report is None:
+        report = single_flight.do("holder_report", key, build_report, *key)
+        with _lock:
+            # Only the latest block's reports are worth keeping.
+            for stale in [k for k in _reports if k[1] < block_number]:
+                del _reports[stale]
+            _reports[key] = report
+    return report
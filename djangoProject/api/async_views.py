@@ -0,0 +1,239 @@
+"""
+Async counterparts of the balance, account listing and transaction views,
+meant to be served by an ASGI server (djangoProject.asgi). Node calls go
+through AsyncWeb3, so a request waiting on the node holds no thread and
+independent calls run concurrently. Transfers and mints are queued in the
+outbox like the sync views do, so nonces are only ever allocated by the
+submitter workers.
+"""
+
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+
+from .authentication import atoken_user
+from .ledger import book_transfer, ledger_enabled, with_ledger_balances
+from .models import CustomUser, OutboxJob
+from .outbox import OutboxFull, enqueue
+from .provider import get_async_contract, get_async_web3
+from .renderers import ORJSONResponse, format_wei
+from .singleflight import async_single_flight
+
+
+async def authenticate_token(request):
+    keyword, _, key = request.headers.get("Authorization", "").partition(" ")
+    if keyword != "Token" or not key:
+        return None
+    return await user_for_token(key)
+
+
+async def user_for_token(key):
+    """
+    Returns the active user owning the token `key`, or None. This is the
+    lookup CachedTokenAuthentication uses, so the user is loaded without
+    its password and private key.
+    """
+    user = await atoken_user(key)
+    return user if user is not None and user.is_active else None
+
+
+async def fetch_balances(addresses):
+    """
+    Reads ETH and VC balances for every address concurrently, all at the
+    same block, with at most ASYNC_RPC_CONCURRENCY calls in flight.
+    Requests for the same addresses at the same time share one read.
+    """
+    return await async_single_flight.do(
+        "async_balances", tuple(addresses), read_balances, addresses
+    )
+
+
+async def read_balances(addresses):
+    web3 = get_async_web3()
+    contract = get_async_contract()
+    block_number = await web3.eth.block_number
+    semaphore = asyncio.Semaphore(settings.ASYNC_RPC_CONCURRENCY)
+
+    async def limited(call):
+        async with semaphore:
+            return await call
+
+    async def read(address):
+        return await asyncio.gather(
+            limited(web3.eth.get_balance(address, block_number)),
+            limited(
+                contract.functions.balanceOf(address).call(
+                    block_identifier=block_number
+                )
+            ),
+        )
+
+    results = await asyncio.gather(*(read(address) for address in addresses))
+    return block_number, dict(zip(addresses, results))
+
+
+def queue_full_response(error):
+    return ORJSONResponse(
+        {"error": str(error)}, status=503, headers={"Retry-After": "5"}
+    )
+
+
+def parse_body(request):
+    try:
+        return json.loads(request.body or b"{}")
+    except ValueError:
+        return {}
+
+
+@require_GET
+async def balance_view(request):
+    user = await authenticate_token(request)
+    if user is None:
+        return ORJSONResponse({"detail": "Authentication required."}, status=401)
+    try:
+        block_number, balances = await fetch_balances([user.wallet_address])
+        balances = await sync_to_async(with_ledger_balances)(balances)
+        ether_balance, token_balance = balances[user.wallet_address]
+        return ORJSONResponse(
+            {
+                "ether_balance": format_wei(ether_balance),
+                "token_balance": format_wei(token_balance),
+                "block_number": block_number,
+            }
+        )
+    except Exception as e:
+        return ORJSONResponse(
+            {"error": f"Failed to retrieve balance: {str(e)}"}, status=400
+        )
+
+
+@require_GET
+async def list_accounts_view(request):
+    try:
+        cursor = int(request.GET.get("cursor", 0))
+        limit = min(
+            int(request.GET.get("limit", settings.ACCOUNTS_PAGE_SIZE)),
+            settings.ACCOUNTS_MAX_PAGE_SIZE,
+        )
+    except ValueError:
+        return ORJSONResponse(
+            {"error": "cursor and limit must be integers."}, status=400
+        )
+    if limit < 1:
+        return ORJSONResponse({"error": "limit must be at least 1."}, status=400)
+
+    try:
+        users = [
+            user
+            async for user in CustomUser.objects.filter(id__gt=cursor)
+            .order_by("id")
+            .only("id", "username", "wallet_address")[: limit + 1]
+        ]
+        has_more = len(users) > limit
+        users = users[:limit]
+        block_number, balances = await fetch_balances(
+            [user.wallet_address for user in users]
+        )
+        balances = await sync_to_async(with_ledger_balances)(balances)
+        accounts = []
+        for user in users:
+            ether_balance, token_balance = balances[user.wallet_address]
+            accounts.append(
+                {
+                    "id": user.id,
+                    "username": user.username,
+                    "wallet_address": user.wallet_address,
+                    "ether_balance": format_wei(ether_balance),
+                    "token_balance": format_wei(token_balance),
+                }
+            )
+        return ORJSONResponse(
+            {
+                "accounts": accounts,
+                "next_cursor": users[-1].id if has_more else None,
+                "block_number": block_number,
+            }
+        )
+    except Exception as e:
+        return ORJSONResponse(
+            {"error": f"Failed to retrieve accounts: {str(e)}"}, status=400
+        )
+
+
+@csrf_exempt
+@require_POST
+async def transfer_view(request):
+    sender = await authenticate_token(request)
+    if sender is None:
+        return ORJSONResponse({"detail": "Authentication required."}, status=401)
+    data = parse_body(request)
+    to_username = data.get("to_username")
+    amount = data.get("amount")
+    if not to_username or not amount:
+        return ORJSONResponse(
+            {"error": "Recipient username and amount are required."}, status=400
+        )
+    try:
+        recipient = await CustomUser.objects.aget(username=to_username)
+        amount_in_wei = int(float(amount) * (10**18))
+        if ledger_enabled():
+            booked = await sync_to_async(book_transfer)(
+                sender, recipient, amount_in_wei
+            )
+            return ORJSONResponse(
+                {"message": "Transfer recorded.", "transfer_id": booked.id}
+            )
+        job = await sync_to_async(enqueue)(
+            OutboxJob.Kind.TRANSFER,
+            recipient_address=recipient.wallet_address,
+            amount=amount_in_wei,
+            sender=sender,
+        )
+        return ORJSONResponse(
+            {"message": "Transaction queued.", "job_id": job.id}, status=202
+        )
+    except CustomUser.DoesNotExist:
+        return ORJSONResponse({"error": "Recipient user does not exist."}, status=400)
+    except OutboxFull as e:
+        return queue_full_response(e)
+    except Exception as e:
+        return ORJSONResponse({"error": f"Transaction failed: {str(e)}"}, status=400)
+
+
+@csrf_exempt
+@require_POST
+async def mint_tokens_view(request):
+    data = parse_body(request)
+    recipient_username = data.get("recipient_username")
+    amount = data.get("amount")
+    if not recipient_username or not amount:
+        return ORJSONResponse(
+            {"error": "Recipient username and amount are required."}, status=400
+        )
+    try:
+        recipient = await CustomUser.objects.aget(username=recipient_username)
+        amount_in_vc = float(amount)
+        job = await sync_to_async(enqueue)(
+            OutboxJob.Kind.MINT,
+            recipient_address=recipient.wallet_address,
+            amount=int(amount_in_vc),
+        )
+        return ORJSONResponse(
+            {
+                "message": "Mint queued.",
+                "job_id": job.id,
+                "recipient_username": recipient_username,
+                "amount": amount_in_vc,
+            },
+            status=202,
+        )
+    except CustomUser.DoesNotExist:
+        return ORJSONResponse({"error": "Recipient user does not exist."}, status=400)
+    except OutboxFull as e:
+        return queue_full_response(e)
+    except Exception as e:
+        return ORJSONResponse({"error": f"Minting failed: {str(e)}"}, status=400)
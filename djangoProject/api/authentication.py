@@ -0,0 +1,149 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import router
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+from .models import CustomUser
+
+# Everything permission checks and the views read from request.user. The
+# password and private_key stay deferred and are only loaded on access.
+USER_FIELDS = [
+    field.attname
+    for field in CustomUser._meta.concrete_fields
+    if field.attname
+    in {"id", "username", "wallet_address", "is_active", "is_staff", "is_superuser"}
+]
+
+
+class TokenCache:
+    """
+    Maps token keys to the USER_FIELDS values of their user. Entries live in
+    a bounded in-process LRU for `ttl` seconds, or in a Django cache backend
+    when `alias` is set so several workers share them and see invalidations.
+    """
+
+    def __init__(self, max_entries, ttl, alias=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.alias = alias
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        if self.alias:
+            values = caches[self.alias].get(self._shared_key(key))
+        else:
+            values = None
+            with self._lock:
+                entry = self.entries.get(key)
+                if entry is not None and time.monotonic() - entry[0] < self.ttl:
+                    self.entries.move_to_end(key)
+                    values = entry[1]
+        with self._lock:
+            if values is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return values
+
+    def set(self, key, values):
+        if self.alias:
+            caches[self.alias].set(self._shared_key(key), values, timeout=self.ttl)
+            return
+        with self._lock:
+            self.entries[key] = (time.monotonic(), values)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, *keys):
+        if self.alias:
+            caches[self.alias].delete_many([self._shared_key(key) for key in keys])
+            return
+        with self._lock:
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def _shared_key(self, key):
+        return f"auth-token:{key}"
+
+
+token_cache = TokenCache(
+    settings.TOKEN_CACHE_SIZE, settings.TOKEN_CACHE_TTL, settings.TOKEN_CACHE_ALIAS
+)
+
+
+def slim_user(values):
+    return CustomUser.from_db(router.db_for_read(CustomUser), USER_FIELDS, values)
+
+
+def tokens():
+    return Token.objects.select_related("user").only(
+        "key", *(f"user__{name}" for name in USER_FIELDS)
+    )
+
+
+def token_user(key):
+    """Returns the slim user owning the token `key`, or None."""
+    values = token_cache.get(key)
+    if values is None:
+        try:
+            token = tokens().get(key=key)
+        except Token.DoesNotExist:
+            return None
+        values = [getattr(token.user, name) for name in USER_FIELDS]
+        token_cache.set(key, values)
+    return slim_user(values)
+
+
+async def atoken_user(key):
+    """token_user for async views and consumers."""
+    values = token_cache.get(key)
+    if values is None:
+        try:
+            token = await tokens().aget(key=key)
+        except Token.DoesNotExist:
+            return None
+        values = [getattr(token.user, name) for name in USER_FIELDS]
+        token_cache.set(key, values)
+    return slim_user(values)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication that resolves keys through token_cache, so a warm
+    request never queries authtoken_token or api_customuser. request.auth
+    is the key itself rather than a Token instance.
+    """
+
+    def authenticate_credentials(self, key):
+        user = token_user(key)
+        if user is None:
+            raise AuthenticationFailed("Invalid token.")
+        if not user.is_active:
+            raise AuthenticationFailed("User inactive or deleted.")
+        return (user, key)
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def invalidate_token(sender, instance, **kwargs):
+    token_cache.invalidate(instance.key)
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def invalidate_user_tokens(sender, instance, **kwargs):
+    token_cache.invalidate(
+        *Token.objects.filter(user_id=instance.pk).values_list("key", flat=True)
+    )
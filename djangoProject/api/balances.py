@@ -0,0 +1,122 @@
+from django.conf import settings
+
+from .cache import balance_cache
+from .models import IndexerCheckpoint, TokenBalance
+from .provider import rpc_batch
+from .singleflight import single_flight
+from .transactions import encode_call
+from .utils import CONTRACT_ADDRESS, web3
+
+
+def latest_block_number():
+    return single_flight.do("block_number", None, lambda: web3.eth.block_number)
+
+
+def current_block_number():
+    """
+    Returns the chain head, asking the node at most once per
+    BALANCE_CACHE_BLOCK_TTL seconds.
+    """
+    block_number = balance_cache.fresh_block_number()
+    if block_number is None:
+        block_number = latest_block_number()
+        balance_cache.observe_block(block_number)
+    return block_number
+
+
+def get_cached_balances(addresses):
+    """
+    Like get_balances, but serves addresses already read at the current
+    block from balance_cache and only fetches the misses.
+    """
+    if settings.BALANCE_SOURCE == "index":
+        return get_balances(addresses)
+    block_number = current_block_number()
+    balances, generations = balance_cache.get_many(addresses, block_number)
+    missing = [address for address in addresses if address not in balances]
+    if missing:
+        _, fetched = get_balances(missing, block_number)
+        balance_cache.set_many(fetched, block_number, generations)
+        balances.update(fetched)
+    return block_number, balances
+
+
+def get_balances(addresses, block_number=None):
+    """
+    Fetches ETH and VC balances (in wei) for many addresses, all read at the
+    same block (the current one unless `block_number` is given). Returns the
+    block number and a dict mapping each address to an
+    (ether_balance, token_balance) pair. Identical reads already in flight
+    in another thread are joined rather than repeated.
+    """
+    if settings.BALANCE_SOURCE == "index":
+        checkpoint = IndexerCheckpoint.objects.filter(
+            name=IndexerCheckpoint.VIRTUAL_CURRENCY, block_number__gte=0
+        ).first()
+        if checkpoint is not None:
+            return checkpoint.block_number, single_flight.do(
+                "indexed_balances",
+                (tuple(addresses), checkpoint.block_number),
+                get_indexed_balances,
+                addresses,
+                checkpoint.block_number,
+            )
+
+    if block_number is None:
+        block_number = latest_block_number()
+    return block_number, single_flight.do(
+        "balances",
+        (tuple(addresses), block_number),
+        read_balances,
+        addresses,
+        block_number,
+    )
+
+
+def read_balances(addresses, block_number):
+    """Reads the balances from the node in JSON-RPC batches."""
+    block = hex(block_number)
+    calls = []
+    for address in addresses:
+        calls.append(("eth_getBalance", [address, block]))
+        calls.append(
+            (
+                "eth_call",
+                [
+                    {
+                        "to": CONTRACT_ADDRESS,
+                        "data": encode_call("balanceOf", [address]),
+                    },
+                    block,
+                ],
+            )
+        )
+    results = rpc_batch(calls, block_number)
+    balances = {}
+    for index, address in enumerate(addresses):
+        balances[address] = (
+            int(results[2 * index], 16),
+            int(results[2 * index + 1], 16),
+        )
+    return balances
+
+
+def get_indexed_balances(addresses, block_number):
+    """
+    Answers VC balances from the event indexer's TokenBalance table, so only
+    the ETH balances need the node. ETH is read at the indexer's checkpoint
+    block to keep both numbers consistent.
+    """
+    token_balances = dict(
+        TokenBalance.objects.filter(address__in=addresses).values_list(
+            "address", "balance"
+        )
+    )
+    block = hex(block_number)
+    results = rpc_batch(
+        [("eth_getBalance", [address, block]) for address in addresses], block_number
+    )
+    return {
+        address: (int(result, 16), int(token_balances.get(address, 0)))
+        for address, result in zip(addresses, results)
+    }
@@ -0,0 +1,211 @@
+"""
+Helpers for `manage.py benchmark`: a throwaway ganache chain, contract
+deployment from the brownie build, a counting JSON-RPC proxy and the
+request driver that records per-request latencies.
+"""
+
+import json
+import os
+import shlex
+import socket
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from eth_account import Account
+from web3 import HTTPProvider, Web3
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until(check, timeout, what):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if check():
+                return
+        except Exception:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError(f"Timed out waiting for {what}.")
+
+
+def start_ganache(command, port, private_key):
+    """
+    Starts ganache with the same chain id, hardfork and gas price as
+    docker-compose, funding the central account so it can deploy.
+    """
+    args = shlex.split(command) + [
+        "--server.port",
+        str(port),
+        "--chain.chainId",
+        "1337",
+        "--chain.hardfork",
+        "berlin",
+        "--miner.defaultGasPrice",
+        "0",
+        "--wallet.accounts",
+        f"{private_key},{1000 * 10**18}",
+        "--logging.quiet",
+    ]
+    process = subprocess.Popen(args, stdout=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    wait_until(lambda: Web3(HTTPProvider(url)).is_connected(), 60, "ganache")
+    return process, url
+
+
+def deploy_contract(rpc_url, build_path, private_key):
+    """
+    Deploys VirtualCurrency like project/scripts/deploy.py: an initial
+    supply of 1,000,000 VC plus a mint of as much again to the owner.
+    """
+    with open(build_path) as f:
+        build = json.load(f)
+    web3 = Web3(HTTPProvider(rpc_url))
+    account = Account.from_key(private_key)
+    factory = web3.eth.contract(abi=build["abi"], bytecode=build["bytecode"])
+
+    def send(function):
+        transaction = function.build_transaction(
+            {
+                "from": account.address,
+                "nonce": web3.eth.get_transaction_count(account.address),
+                "gasPrice": 0,
+            }
+        )
+        signed_transaction = account.sign_transaction(transaction)
+        tx_hash = web3.eth.send_raw_transaction(signed_transaction.rawTransaction)
+        return web3.eth.wait_for_transaction_receipt(tx_hash)
+
+    address = send(factory.constructor(1000000)).contractAddress
+    contract = web3.eth.contract(address=address, abi=build["abi"])
+    send(contract.functions.mint(account.address, 1000000 * 10**18))
+    return address
+
+
+class RpcRecorder:
+    """
+    Forwards JSON-RPC requests to `upstream` and counts the calls and HTTP
+    round trips, so the node traffic behind each scenario can be reported.
+    """
+
+    def __init__(self, upstream):
+        self.upstream = upstream
+        self.calls = 0
+        self.round_trips = 0
+        self._lock = threading.Lock()
+        self._session = requests.Session()
+        self._server = None
+
+    def start(self):
+        recorder = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                payload = json.loads(body)
+                with recorder._lock:
+                    recorder.round_trips += 1
+                    recorder.calls += len(payload) if isinstance(payload, list) else 1
+                response = recorder._session.post(
+                    recorder.upstream,
+                    data=body,
+                    headers={"Content-Type": "application/json"},
+                )
+                self.send_response(response.status_code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(response.content)))
+                self.end_headers()
+                self.wfile.write(response.content)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", free_port()), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+
+    def snapshot(self):
+        with self._lock:
+            return self.calls, self.round_trips
+
+
+def start_django(manage_args, env):
+    return subprocess.Popen(
+        ["python", "manage.py", *manage_args],
+        env={**os.environ, **env},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def drive(send, count, concurrency):
+    """
+    Calls send(session, i) for i in range(count) from `concurrency` threads,
+    each with its own keep-alive session. Returns the wall time and a
+    (latency_seconds, status_code, json_body) tuple per request.
+    """
+    local = threading.local()
+
+    def timed(i):
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        started = time.perf_counter()
+        try:
+            response = send(local.session, i)
+            status, body = response.status_code, response.json()
+        except Exception as e:
+            status, body = None, {"error": str(e)}
+        return time.perf_counter() - started, status, body
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(timed, range(count)))
+    return time.perf_counter() - started, results
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(elapsed, results, rpc_calls, rpc_round_trips):
+    latencies = sorted(latency * 1000 for latency, _, _ in results)
+    statuses = {}
+    for _, status, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    errors = sum(
+        1 for _, status, _ in results if status is None or not 200 <= status < 300
+    )
+    count = len(results)
+    return {
+        "requests": count,
+        "errors": errors,
+        "statuses": statuses,
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_rps": round(count / elapsed, 2) if elapsed else None,
+        "latency_ms": {
+            "mean": round(sum(latencies) / count, 2) if count else None,
+            "p50": round(percentile(latencies, 50), 2) if count else None,
+            "p95": round(percentile(latencies, 95), 2) if count else None,
+            "p99": round(percentile(latencies, 99), 2) if count else None,
+            "max": round(latencies[-1], 2) if count else None,
+        },
+        "rpc_calls_per_request": round(rpc_calls / count, 3) if count else None,
+        "rpc_round_trips_per_request": (
+            round(rpc_round_trips / count, 3) if count else None
+        ),
+    }
@@ -0,0 +1,157 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class BalanceCache:
+    """
+    Caches (ether_balance, token_balance) pairs keyed by address and block
+    number. Entries live in a bounded in-process LRU, or in a Django cache
+    backend when `alias` is set so several workers share them. Local entries
+    are dropped as soon as a newer block is observed.
+
+    invalidate only reaches other processes through the shared backend. In
+    local mode a transaction sent by the run_outbox worker leaves the web
+    workers' entries alone until they see the next block, at most
+    BALANCE_CACHE_BLOCK_TTL seconds after it is mined.
+
+    get_many also returns the generation each address was read at; pass it
+    to set_many so a balance fetched before an invalidation is not cached
+    after it.
+    """
+
+    def __init__(self, max_entries, block_ttl, alias=None, timeout=None):
+        self.max_entries = max_entries
+        self.block_ttl = block_ttl
+        self.alias = alias
+        self.timeout = timeout
+        self.entries = OrderedDict()
+        self.generations = {}
+        self.block_number = -1
+        self.block_checked_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    def fresh_block_number(self):
+        """Returns the last observed block if it was seen within block_ttl."""
+        with self._lock:
+            if time.monotonic() - self.block_checked_at < self.block_ttl:
+                return self.block_number
+        return None
+
+    def observe_block(self, block_number):
+        with self._lock:
+            self.block_checked_at = time.monotonic()
+            if block_number > self.block_number:
+                self.block_number = block_number
+                self.entries.clear()
+                # set_many refuses older blocks, so earlier generations
+                # can no longer be written back.
+                self.generations.clear()
+
+    def get_many(self, addresses, block_number):
+        """Returns the cached balances and the generations they were read at."""
+        if self.alias:
+            generations = self._shared_generations(addresses)
+            keys = self._shared_keys(generations, block_number)
+            found = caches[self.alias].get_many(list(keys))
+            balances = {keys[key]: tuple(value) for key, value in found.items()}
+        else:
+            balances = {}
+            with self._lock:
+                generations = {
+                    address: self.generations.get(address, 0) for address in addresses
+                }
+                for address in addresses:
+                    entry = self.entries.get((address, block_number))
+                    if entry is not None:
+                        self.entries.move_to_end((address, block_number))
+                        balances[address] = entry
+        with self._lock:
+            self.hits += len(balances)
+            self.misses += len(addresses) - len(balances)
+        return balances, generations
+
+    def set_many(self, balances, block_number, generations):
+        if self.alias:
+            # Invalidated addresses have moved on to a newer generation, so
+            # their stale entries land under keys nobody reads.
+            keys = self._shared_keys(
+                {address: generations[address] for address in balances}, block_number
+            )
+            caches[self.alias].set_many(
+                {key: balances[address] for key, address in keys.items()},
+                timeout=self.timeout,
+            )
+            return
+        with self._lock:
+            if block_number < self.block_number:
+                return
+            for address, value in balances.items():
+                if self.generations.get(address, 0) != generations[address]:
+                    continue
+                self.entries[(address, block_number)] = value
+                self.entries.move_to_end((address, block_number))
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, *addresses):
+        """
+        Drops cached balances for addresses our own transactions touched and
+        forces the next read to ask for the current block.
+        """
+        with self._lock:
+            self.invalidations += len(addresses)
+            self.block_checked_at = 0.0
+            if not self.alias:
+                for address in addresses:
+                    self.generations[address] = self.generations.get(address, 0) + 1
+                for key in [key for key in self.entries if key[0] in addresses]:
+                    del self.entries[key]
+        if self.alias:
+            cache = caches[self.alias]
+            for address in addresses:
+                cache.add(self._generation_key(address), 0, timeout=None)
+                cache.incr(self._generation_key(address))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "entries": len(self.entries),
+                "block_number": self.block_number,
+                "backend": self.alias or "local",
+            }
+
+    def _generation_key(self, address):
+        return f"balance-generation:{address}"
+
+    def _shared_generations(self, addresses):
+        found = caches[self.alias].get_many(
+            [self._generation_key(address) for address in addresses]
+        )
+        return {
+            address: found.get(self._generation_key(address), 0)
+            for address in addresses
+        }
+
+    def _shared_keys(self, generations, block_number):
+        return {
+            f"balance:{address}:{block_number}:{generation}": address
+            for address, generation in generations.items()
+        }
+
+
+balance_cache = BalanceCache(
+    max_entries=settings.BALANCE_CACHE_SIZE,
+    block_ttl=settings.BALANCE_CACHE_BLOCK_TTL,
+    alias=settings.BALANCE_CACHE_ALIAS,
+    timeout=settings.BALANCE_CACHE_TIMEOUT,
+)
@@ -0,0 +1,191 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from eth_utils import event_abi_to_log_topic
+
+from .models import IndexerCheckpoint, TokenBalance, TokenEvent
+from .provider import rpc_batch
+from .transactions import encode_call
+from .utils import CONTRACT, CONTRACT_ADDRESS, web3
+
+ZERO_ADDRESS = "0x0000000000000000000000000000000000000000"
+
+EVENTS = {
+    event_abi_to_log_topic(event.abi): event
+    for event in (
+        CONTRACT.events.Transfer(),
+        CONTRACT.events.Mint(),
+        CONTRACT.events.Approval(),
+    )
+}
+
+
+def get_checkpoint():
+    checkpoint, _ = IndexerCheckpoint.objects.get_or_create(
+        name=IndexerCheckpoint.VIRTUAL_CURRENCY,
+        defaults={"block_number": settings.INDEXER_START_BLOCK - 1},
+    )
+    return checkpoint
+
+
+def decode_log(log):
+    decoded = EVENTS[log["topics"][0]].process_log(log)
+    args = decoded["args"]
+    if decoded["event"] == TokenEvent.Name.TRANSFER:
+        from_address, to_address = args["from"], args["to"]
+    elif decoded["event"] == TokenEvent.Name.APPROVAL:
+        from_address, to_address = args["owner"], args["spender"]
+    else:
+        from_address, to_address = "", args["to"]
+    return TokenEvent(
+        event=decoded["event"],
+        block_number=decoded["blockNumber"],
+        block_hash=decoded["blockHash"].hex(),
+        transaction_hash=decoded["transactionHash"].hex(),
+        log_index=decoded["logIndex"],
+        from_address=from_address,
+        to_address=to_address,
+        value=args["value"],
+    )
+
+
+def balance_deltas(events):
+    """Sums the net balance change per address for Transfer and Mint events."""
+    deltas = defaultdict(int)
+    for event in events:
+        if event.event == TokenEvent.Name.APPROVAL:
+            continue
+        if event.from_address and event.from_address != ZERO_ADDRESS:
+            deltas[event.from_address] -= event.value
+        if event.to_address != ZERO_ADDRESS:
+            deltas[event.to_address] += event.value
+    return deltas
+
+
+def opening_balances(addresses, block_number):
+    """
+    Reads balanceOf at `block_number` for addresses seen for the first time,
+    so balances held before the indexed range (the constructor's supply,
+    for one) carry over. Blocks before the deployment read as zero.
+    """
+    if block_number < 0:
+        return {address: 0 for address in addresses}
+    block = hex(block_number)
+    results = rpc_batch(
+        [
+            (
+                "eth_call",
+                [
+                    {
+                        "to": CONTRACT_ADDRESS,
+                        "data": encode_call("balanceOf", [address]),
+                    },
+                    block,
+                ],
+            )
+            for address in addresses
+        ],
+        block_number,
+    )
+    return {
+        address: int(result, 16) if result != "0x" else 0
+        for address, result in zip(addresses, results)
+    }
+
+
+def apply_chunk(checkpoint, logs, end_block, end_hash):
+    events = [decode_log(log) for log in logs if log["topics"][0] in EVENTS]
+    deltas = balance_deltas(events)
+    with transaction.atomic():
+        TokenEvent.objects.bulk_create(events, ignore_conflicts=True)
+        rows = TokenBalance.objects.in_bulk(list(deltas), field_name="address")
+        new_addresses = [address for address in deltas if address not in rows]
+        if new_addresses:
+            opening_block = checkpoint.block_number
+            for address, balance in opening_balances(
+                new_addresses, opening_block
+            ).items():
+                rows[address] = TokenBalance(
+                    address=address,
+                    balance=balance,
+                    opening_balance=balance,
+                    opening_block=opening_block,
+                    updated_block=opening_block,
+                )
+        for address, delta in deltas.items():
+            rows[address].balance += delta
+            rows[address].updated_block = end_block
+        TokenBalance.objects.bulk_create(
+            [row for row in rows.values() if row.pk is None]
+        )
+        TokenBalance.objects.bulk_update(
+            [row for row in rows.values() if row.pk is not None],
+            ["balance", "updated_block"],
+        )
+        checkpoint.block_number = end_block
+        checkpoint.block_hash = end_hash
+        checkpoint.save()
+    return len(events)
+
+
+def rollback(checkpoint, fork_block):
+    """
+    Drops everything indexed after `fork_block` and recomputes the balances
+    it touched from their opening balance and the events that remain.
+    """
+    with transaction.atomic():
+        orphaned = TokenEvent.objects.filter(block_number__gt=fork_block)
+        affected = set(orphaned.values_list("from_address", flat=True))
+        affected |= set(orphaned.values_list("to_address", flat=True))
+        orphaned.delete()
+        TokenBalance.objects.filter(opening_block__gte=fork_block).delete()
+        for row in TokenBalance.objects.filter(address__in=affected):
+            remaining = TokenEvent.objects.filter(
+                Q(from_address=row.address) | Q(to_address=row.address)
+            ).exclude(event=TokenEvent.Name.APPROVAL)
+            row.balance = row.opening_balance + balance_deltas(remaining).get(
+                row.address, 0
+            )
+            row.updated_block = fork_block
+            row.save(update_fields=["balance", "updated_block"])
+        checkpoint.block_number = fork_block
+        checkpoint.block_hash = (
+            web3.eth.get_block(fork_block)["hash"].hex() if fork_block >= 0 else ""
+        )
+        checkpoint.save()
+
+
+def index_new_blocks(chunk_size, confirmations):
+    """
+    Catches the index up to `confirmations` blocks behind the head, fetching
+    logs `chunk_size` blocks at a time. If the checkpointed block is no
+    longer on the canonical chain, the last INDEXER_REORG_DEPTH blocks are
+    rolled back and indexed again. Returns the number of events ingested.
+    """
+    checkpoint = get_checkpoint()
+    if checkpoint.block_hash:
+        chain_hash = web3.eth.get_block(checkpoint.block_number)["hash"].hex()
+        if chain_hash != checkpoint.block_hash:
+            fork_block = max(
+                checkpoint.block_number - settings.INDEXER_REORG_DEPTH,
+                settings.INDEXER_START_BLOCK - 1,
+            )
+            print(
+                f"Reorg detected at block {checkpoint.block_number}, rewinding to {fork_block}"
+            )
+            rollback(checkpoint, fork_block)
+
+    head = web3.eth.block_number - confirmations
+    ingested = 0
+    start = checkpoint.block_number + 1
+    while start <= head:
+        end = min(start + chunk_size - 1, head)
+        logs = web3.eth.get_logs(
+            {"address": CONTRACT_ADDRESS, "fromBlock": start, "toBlock": end}
+        )
+        end_hash = web3.eth.get_block(end)["hash"].hex()
+        ingested += apply_chunk(checkpoint, logs, end, end_hash)
+        start = end + 1
+    return ingested
@@ -0,0 +1,236 @@
+"""
+Per-request accounting of where time goes: JSON-RPC calls, SQL queries,
+password hashing and signing. Each category is timed into the current
+request (reported as a Server-Timing header) and into process-wide
+histograms rendered in the Prometheus text format by metrics_view.
+"""
+
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+_current = ContextVar("request_timings", default=None)
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.total += seconds
+
+
+class Registry:
+    """Histograms keyed by metric name and a sorted tuple of label pairs."""
+
+    def __init__(self):
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def render(self):
+        with self._lock:
+            snapshot = {
+                key: (list(histogram.counts), histogram.total)
+                for key, histogram in self.histograms.items()
+            }
+        lines = []
+        for name in sorted({name for name, _ in snapshot}):
+            lines.append(f"# TYPE {name} histogram")
+            for (metric, labels), (counts, total) in sorted(snapshot.items()):
+                if metric != name:
+                    continue
+                label_text = ",".join(f'{key}="{value}"' for key, value in labels)
+                prefix = f"{label_text}," if label_text else ""
+                cumulative = 0
+                for bound, count in zip(BUCKETS, counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+                cumulative += counts[-1]
+                lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {cumulative}')
+                lines.append(f"{name}_sum{{{label_text}}} {total}")
+                lines.append(f"{name}_count{{{label_text}}} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+class RequestTimings:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.categories = {}
+        self.rpc_methods = {}
+
+    def add(self, category, label, seconds):
+        count, total = self.categories.get(category, (0, 0.0))
+        self.categories[category] = (count + 1, total + seconds)
+        if category == "rpc":
+            count, total = self.rpc_methods.get(label, (0, 0.0))
+            self.rpc_methods[label] = (count + 1, total + seconds)
+
+    def server_timing(self, elapsed):
+        parts = [
+            f'{category};desc="{count}x";dur={total * 1000:.1f}'
+            for category, (count, total) in self.categories.items()
+        ]
+        parts.append(f"total;dur={elapsed * 1000:.1f}")
+        return ", ".join(parts)
+
+
+def record(category, label, seconds):
+    """Adds one timed operation to the current request and the histograms."""
+    timings = _current.get()
+    if timings is not None:
+        timings.add(category, label, seconds)
+    registry.observe(f"api_{category}_duration_seconds", seconds, op=label)
+
+
+@contextmanager
+def timed(category, label):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(category, label, time.perf_counter() - started)
+
+
+def rpc_timing_middleware(make_request, web3):
+    def middleware(method, params):
+        with timed("rpc", method):
+            return make_request(method, params)
+
+    return middleware
+
+
+async def async_rpc_timing_middleware(make_request, web3):
+    async def middleware(method, params):
+        with timed("rpc", method):
+            return await make_request(method, params)
+
+    return middleware
+
+
+def db_timing_wrapper(execute, sql, params, many, context):
+    """Connection execute wrapper, installed on every new connection."""
+    with timed("db", sql.split(None, 1)[0].upper()):
+        return execute(sql, params, many, context)
+
+
+def install_db_wrapper(sender, connection, **kwargs):
+    if db_timing_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(db_timing_wrapper)
+
+
+class TimedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    The default hasher with its key derivation timed as "hash". verify()
+    goes through encode(), so checking a password is counted once too.
+    """
+
+    def encode(self, password, salt, iterations=None):
+        with timed("hash", self.algorithm):
+            return super().encode(password, salt, iterations)
+
+
+class InstrumentationMiddleware:
+    """
+    Collects the timings of each request, sets the Server-Timing header,
+    feeds the request histogram and logs requests slower than
+    SLOW_REQUEST_SECONDS with their breakdown.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _current.set(RequestTimings())
+        try:
+            response = self.get_response(request)
+            self.finish(request, response, _current.get())
+            return response
+        finally:
+            _current.reset(token)
+
+    async def __acall__(self, request):
+        token = _current.set(RequestTimings())
+        try:
+            response = await self.get_response(request)
+            self.finish(request, response, _current.get())
+            return response
+        finally:
+            _current.reset(token)
+
+    def finish(self, request, response, timings):
+        elapsed = time.perf_counter() - timings.started
+        response["Server-Timing"] = timings.server_timing(elapsed)
+        match = request.resolver_match
+        view = match.url_name if match and match.url_name else "unmatched"
+        registry.observe(
+            "api_request_duration_seconds",
+            elapsed,
+            view=view,
+            method=request.method,
+            status=response.status_code,
+        )
+        if elapsed >= settings.SLOW_REQUEST_SECONDS:
+            logger.warning(
+                "Slow request %s %s took %.1fms (%s); rpc methods: %s",
+                request.method,
+                request.path,
+                elapsed * 1000,
+                timings.server_timing(elapsed),
+                {
+                    method: f"{count}x {total * 1000:.1f}ms"
+                    for method, (count, total) in timings.rpc_methods.items()
+                },
+            )
+
+
+def metrics_view(request):
+    return HttpResponse(
+        registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
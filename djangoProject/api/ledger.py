@@ -0,0 +1,360 @@
+"""
+Internal ledger for TRANSFER_MODE = "ledger". Transfers between users are
+booked as double-entry rows in the database and only the net change of
+each account is pushed on-chain by `settle`, in a few batched permit
+transactions instead of one transaction per transfer.
+"""
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .balances import get_balances
+from .models import (
+    LedgerAccount,
+    LedgerEntry,
+    LedgerSettlement,
+    LedgerTransfer,
+    TrackedTransaction,
+)
+from .receipts import normalize_hash
+from .utils import perform_transfers
+
+
+class InsufficientFunds(Exception):
+    pass
+
+
+def ledger_enabled():
+    return settings.TRANSFER_MODE == "ledger"
+
+
+def open_accounts(users):
+    """
+    Creates the missing LedgerAccounts of `users`, opening each at the
+    user's current on-chain VC balance.
+    """
+    existing = set(
+        LedgerAccount.objects.filter(user__in=users).values_list("user_id", flat=True)
+    )
+    missing = [user for user in users if user.pk not in existing]
+    if not missing:
+        return
+    _, balances = get_balances([user.wallet_address for user in missing])
+    LedgerAccount.objects.bulk_create(
+        [
+            LedgerAccount(
+                user_id=user.pk, chain_balance=balances[user.wallet_address][1]
+            )
+            for user in missing
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def book_transfer(sender, recipient, amount):
+    """
+    Books `amount` wei from `sender` to `recipient`. Both account rows are
+    written before they are read, which takes their row locks (the database
+    write lock on SQLite), so the sender's available balance is checked
+    while no concurrent booking or settlement can change it.
+    """
+    if amount <= 0:
+        raise ValueError("The amount must be positive.")
+    if sender.pk == recipient.pk:
+        raise ValueError("Cannot transfer to yourself.")
+    open_accounts([sender, recipient])
+    with transaction.atomic():
+        accounts = LedgerAccount.objects.filter(user_id__in=[sender.pk, recipient.pk])
+        accounts.update(updated_at=timezone.now())
+        accounts = {account.user_id: account for account in accounts}
+        debit, credit = accounts[sender.pk], accounts[recipient.pk]
+        if debit.available < amount:
+            raise InsufficientFunds("Insufficient balance.")
+        debit.pending_debit += amount
+        credit.pending_credit += amount
+        debit.save(update_fields=["pending_debit", "updated_at"])
+        credit.save(update_fields=["pending_credit", "updated_at"])
+        ledger_transfer = LedgerTransfer.objects.create(
+            sender=debit, recipient=credit, amount=amount
+        )
+        LedgerEntry.objects.bulk_create(
+            [
+                LedgerEntry(
+                    account=debit,
+                    transfer=ledger_transfer,
+                    side=LedgerEntry.Side.DEBIT,
+                    amount=amount,
+                ),
+                LedgerEntry(
+                    account=credit,
+                    transfer=ledger_transfer,
+                    side=LedgerEntry.Side.CREDIT,
+                    amount=amount,
+                ),
+            ]
+        )
+    return ledger_transfer
+
+
+def with_ledger_balances(balances):
+    """
+    Replaces the on-chain VC balance in {address: (ether, token)} with the
+    ledger's available balance for every address that has a LedgerAccount.
+    """
+    if not ledger_enabled():
+        return balances
+    accounts = LedgerAccount.objects.filter(
+        user__wallet_address__in=list(balances)
+    ).values_list(
+        "user__wallet_address", "chain_balance", "pending_credit", "pending_debit"
+    )
+    balances = dict(balances)
+    for address, chain_balance, pending_credit, pending_debit in accounts:
+        balances[address] = (
+            balances[address][0],
+            chain_balance + pending_credit - pending_debit,
+        )
+    return balances
+
+
+def changed_accounts(addresses, since):
+    """Returns those of `addresses` whose LedgerAccount changed after `since`."""
+    return list(
+        LedgerAccount.objects.filter(
+            user__wallet_address__in=addresses, updated_at__gt=since
+        ).values_list("user__wallet_address", flat=True)
+    )
+
+
+def net_legs(accounts):
+    """
+    Pairs accounts that owe (net debit) with accounts that are owed (net
+    credit) into (debtor, creditor, amount) legs. The nets sum to zero, so
+    this needs at most one leg fewer than there are accounts.
+    """
+    debtors, creditors = [], []
+    for account in accounts:
+        net = account.pending_credit - account.pending_debit
+        if net < 0:
+            debtors.append([account, -net])
+        elif net > 0:
+            creditors.append([account, net])
+    legs = []
+    d = c = 0
+    while d < len(debtors) and c < len(creditors):
+        amount = min(debtors[d][1], creditors[c][1])
+        legs.append((debtors[d][0], creditors[c][0], amount))
+        debtors[d][1] -= amount
+        creditors[c][1] -= amount
+        if not debtors[d][1]:
+            d += 1
+        if not creditors[c][1]:
+            c += 1
+    return legs
+
+
+def restore(legs):
+    """
+    Moves (debtor_id, creditor_id, amount) legs that did not go through
+    on-chain back into pending.
+    """
+    amounts = {}
+    for debtor_id, creditor_id, amount in legs:
+        amounts.setdefault(debtor_id, [0, 0])[0] += amount
+        amounts.setdefault(creditor_id, [0, 0])[1] += amount
+    with transaction.atomic():
+        accounts = LedgerAccount.objects.filter(pk__in=list(amounts))
+        accounts.update(updated_at=timezone.now())
+        accounts = list(accounts.order_by("id"))
+        for account in accounts:
+            debited, credited = amounts[account.pk]
+            account.chain_balance += debited - credited
+            account.pending_debit += debited
+            account.pending_credit += credited
+            account.updated_at = timezone.now()
+        LedgerAccount.objects.bulk_update(
+            accounts,
+            ["chain_balance", "pending_credit", "pending_debit", "updated_at"],
+        )
+
+
+def settle(batch_size=None):
+    """
+    Nets every unsettled transfer and submits the resulting legs on-chain,
+    LEDGER_SETTLE_BATCH legs per transaction. The pending amounts are
+    moved into chain_balance before submitting, so transfers booked
+    meanwhile start a new round; a transaction that fails to submit puts
+    its legs back into pending for the next run, and confirm_settlements
+    does the same for legs that fail on-chain. Returns the
+    LedgerSettlement, or None when there was nothing to settle.
+    """
+    batch_size = batch_size or settings.LEDGER_SETTLE_BATCH
+    with transaction.atomic():
+        settlement = LedgerSettlement.objects.create()
+        # Claim the accounts with a conditional UPDATE before reading them:
+        # a concurrent run claims none of the same rows, and bookings on
+        # them wait until this transaction has moved their pending amounts.
+        claimed = (
+            LedgerAccount.objects.filter(settlement=None)
+            .exclude(pending_credit=0, pending_debit=0)
+            .update(settlement=settlement)
+        )
+        if not claimed:
+            settlement.delete()
+            return None
+        accounts = list(
+            LedgerAccount.objects.filter(settlement=settlement)
+            .select_related("user")
+            .order_by("id")
+        )
+        # Transfers from unclaimed accounts may commit while this runs;
+        # their amounts are not in this snapshot, so leave them unassigned.
+        settlement.transfers = LedgerTransfer.objects.filter(
+            settlement=None, sender__in=accounts
+        ).update(settlement=settlement)
+        legs = net_legs(accounts)
+        for account in accounts:
+            account.chain_balance += account.pending_credit - account.pending_debit
+            account.pending_credit = account.pending_debit = 0
+            account.settlement = None
+            account.updated_at = timezone.now()
+        LedgerAccount.objects.bulk_update(
+            accounts,
+            [
+                "chain_balance",
+                "pending_credit",
+                "pending_debit",
+                "settlement",
+                "updated_at",
+            ],
+        )
+
+    errors = []
+    for start in range(0, len(legs), batch_size):
+        chunk = legs[start : start + batch_size]
+        try:
+            tx_hash = perform_transfers(
+                settings.CENTRAL_ACCOUNT_PRIVATE_KEY,
+                [
+                    (
+                        debtor.user.wallet_address,
+                        creditor.user.wallet_address,
+                        amount,
+                        debtor.user.private_key,
+                    )
+                    for debtor, creditor, amount in chunk
+                ],
+            )
+        except Exception as e:
+            errors.append(str(e))
+            restore(
+                [(debtor.pk, creditor.pk, amount) for debtor, creditor, amount in chunk]
+            )
+            continue
+        settlement.tx_hashes.append(tx_hash)
+        settlement.legs.extend(
+            {
+                "debtor": debtor.pk,
+                "creditor": creditor.pk,
+                "amount": str(amount),
+                "tx_hash": tx_hash,
+                "index": index,
+            }
+            for index, (debtor, creditor, amount) in enumerate(chunk)
+        )
+    settlement.status = (
+        LedgerSettlement.Status.SUBMITTED
+        if settlement.tx_hashes or not legs
+        else LedgerSettlement.Status.FAILED
+    )
+    settlement.error = "\n".join(errors)
+    settlement.save()
+    return settlement
+
+
+def confirm_settlements():
+    """
+    Closes submitted settlements once track_receipts has resolved all of
+    their transactions. Legs the contract skipped (PermitTransferFailed),
+    and every leg of a reverted or dropped transaction, go back into
+    pending to be settled again. Returns the number of legs put back.
+    """
+    restored = 0
+    for settlement in LedgerSettlement.objects.filter(
+        status=LedgerSettlement.Status.SUBMITTED
+    ).order_by("id"):
+        txs = {
+            tx.tx_hash: tx
+            for tx in TrackedTransaction.objects.filter(
+                tx_hash__in=[normalize_hash(h) for h in settlement.tx_hashes]
+            )
+        }
+        if len(txs) < len(settlement.tx_hashes) or any(
+            tx.status == TrackedTransaction.Status.PENDING for tx in txs.values()
+        ):
+            continue
+        failed = []
+        for leg in settlement.legs:
+            tx = txs[normalize_hash(leg["tx_hash"])]
+            if (
+                tx.status != TrackedTransaction.Status.CONFIRMED
+                or leg["index"] in tx.failed_transfers
+            ):
+                failed.append((leg["debtor"], leg["creditor"], int(leg["amount"])))
+        error = settlement.error
+        if failed:
+            error = "\n".join(
+                filter(None, [error, f"{len(failed)} legs failed on-chain."])
+            )
+        with transaction.atomic():
+            closed = LedgerSettlement.objects.filter(
+                pk=settlement.pk, status=LedgerSettlement.Status.SUBMITTED
+            ).update(
+                status=LedgerSettlement.Status.CONFIRMED,
+                error=error,
+                updated_at=timezone.now(),
+            )
+            if closed and failed:
+                restore(failed)
+                restored += len(failed)
+    return restored
+
+
+def reconcile(batch_size=None):
+    """
+    Re-reads chain_balance from the chain for accounts with nothing pending,
+    which picks up mints and funding. Skipped while any settlement is
+    unconfirmed: the chain would not show it yet, and legs that failed must
+    go back into pending before their accounts are overwritten. Returns
+    the number of accounts refreshed.
+    """
+    batch_size = batch_size or settings.ACCOUNTS_STREAM_CHUNK
+    if LedgerSettlement.objects.filter(
+        status=LedgerSettlement.Status.SUBMITTED
+    ).exists():
+        return 0
+
+    refreshed = 0
+    idle = LedgerAccount.objects.filter(pending_credit=0, pending_debit=0)
+    cursor = 0
+    while True:
+        chunk = list(
+            idle.filter(id__gt=cursor)
+            .select_related("user")
+            .only("id", "user__wallet_address")
+            .order_by("id")[:batch_size]
+        )
+        if not chunk:
+            return refreshed
+        cursor = chunk[-1].id
+        _, balances = get_balances([account.user.wallet_address for account in chunk])
+        now = timezone.now()
+        with transaction.atomic():
+            for account in chunk:
+                # Only written while still idle, so an account that booked
+                # a transfer since the read keeps its value.
+                refreshed += idle.filter(pk=account.pk).update(
+                    chain_balance=balances[account.user.wallet_address][1],
+                    updated_at=now,
+                )
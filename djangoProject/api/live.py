@@ -0,0 +1,181 @@
+"""
+Live balance updates over WebSockets, routed here by djangoProject.asgi.
+One BalanceWatcher per process follows the chain head and reads the
+VirtualCurrency Transfer and Mint logs of each new block once, then
+refreshes only the balances of subscribed addresses those logs touch.
+In ledger mode it also refreshes subscribed addresses whose LedgerAccount
+changed, so booked transfers are pushed without waiting for a settlement.
+Clients are sent a message only when their balance actually changed.
+"""
+
+import asyncio
+import json
+from datetime import timedelta
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+from eth_utils import event_abi_to_log_topic, to_checksum_address
+
+from .async_views import fetch_balances, user_for_token
+from .ledger import changed_accounts, ledger_enabled, with_ledger_balances
+from .provider import get_async_contract, get_async_web3
+from .renderers import format_wei
+
+BALANCE_PATH = "/ws/balance/"
+
+
+class BalanceWatcher:
+    """
+    Fans balance changes out to per-connection queues. Each queue holds
+    only the latest message, so a slow client skips stale balances instead
+    of buffering them. The polling task runs while anyone is subscribed.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.subscribers = {}
+        self.balances = {}
+        self._task = None
+
+    def subscribe(self, address):
+        queue = asyncio.Queue(maxsize=1)
+        self.subscribers.setdefault(address, set()).add(queue)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+            self._task.add_done_callback(report_failure)
+        return queue
+
+    def unsubscribe(self, address, queue):
+        queues = self.subscribers.get(address, set())
+        queues.discard(queue)
+        if not queues:
+            self.subscribers.pop(address, None)
+            self.balances.pop(address, None)
+
+    def publish(self, address, ether_balance, token_balance, block_number, queues):
+        self.balances[address] = (ether_balance, token_balance)
+        message = {
+            "ether_balance": format_wei(ether_balance),
+            "token_balance": format_wei(token_balance),
+            "block_number": block_number,
+        }
+        for queue in queues:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(message)
+
+    async def send_current(self, address, queue):
+        """Sends a new subscriber the balance it starts from."""
+        block_number, balances = await fetch_balances([address])
+        balances = await sync_to_async(with_ledger_balances)(balances)
+        self.publish(address, *balances[address], block_number, [queue])
+
+    async def refresh(self, addresses):
+        block_number, balances = await fetch_balances(addresses)
+        balances = await sync_to_async(with_ledger_balances)(balances)
+        for address in addresses:
+            balance = tuple(balances[address])
+            if address in self.subscribers and balance != self.balances.get(address):
+                self.publish(address, *balance, block_number, self.subscribers[address])
+
+    async def run(self):
+        web3 = get_async_web3()
+        contract = get_async_contract()
+        topics = [
+            event_abi_to_log_topic(event.abi)
+            for event in (contract.events.Transfer(), contract.events.Mint())
+        ]
+        last_block = await web3.eth.block_number
+        checked = timezone.now()
+        while self.subscribers:
+            await asyncio.sleep(self.interval)
+            try:
+                touched = set()
+                if ledger_enabled():
+                    # Look back one extra interval for bookings that were
+                    # still committing at the last check; refresh only
+                    # publishes balances that changed.
+                    now = timezone.now()
+                    touched.update(
+                        await sync_to_async(changed_accounts)(
+                            list(self.subscribers),
+                            checked - timedelta(seconds=self.interval),
+                        )
+                    )
+                    checked = now
+                head = await web3.eth.block_number
+                if head > last_block:
+                    logs = await web3.eth.get_logs(
+                        {
+                            "address": settings.CONTRACT_ADDRESS,
+                            "fromBlock": last_block + 1,
+                            "toBlock": head,
+                            "topics": [topics],
+                        }
+                    )
+                    last_block = head
+                    touched.update(
+                        to_checksum_address(topic[-20:])
+                        for log in logs
+                        for topic in log["topics"][1:]
+                    )
+                addresses = sorted(touched & set(self.subscribers))
+                if addresses:
+                    await self.refresh(addresses)
+            except Exception as e:
+                print(f"Balance watcher failed: {str(e)}")
+
+
+balance_watcher = BalanceWatcher(settings.LIVE_POLL_INTERVAL)
+
+
+def report_failure(task):
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Balance push task failed: {task.exception()!r}")
+
+
+def token_from_scope(scope):
+    """Reads the token from ?token= (browsers cannot set headers) or Authorization."""
+    query = parse_qs(scope.get("query_string", b"").decode())
+    if query.get("token"):
+        return query["token"][0]
+    headers = dict(scope.get("headers", []))
+    keyword, _, key = headers.get(b"authorization", b"").decode().partition(" ")
+    return key if keyword == "Token" else None
+
+
+async def balance_socket(scope, receive, send):
+    """
+    ASGI WebSocket app that pushes the authenticated user's balances as
+    JSON messages shaped like the async balance view's response.
+    """
+    message = await receive()
+    if message["type"] != "websocket.connect":
+        return
+    key = token_from_scope(scope)
+    user = await user_for_token(key) if key else None
+    if user is None:
+        await send({"type": "websocket.close", "code": 4401})
+        return
+    await send({"type": "websocket.accept"})
+
+    address = user.wallet_address
+    queue = balance_watcher.subscribe(address)
+
+    async def push():
+        await balance_watcher.send_current(address, queue)
+        while True:
+            await send(
+                {"type": "websocket.send", "text": json.dumps(await queue.get())}
+            )
+
+    pusher = asyncio.create_task(push())
+    pusher.add_done_callback(report_failure)
+    try:
+        while (await receive())["type"] != "websocket.disconnect":
+            pass
+    finally:
+        pusher.cancel()
+        balance_watcher.unsubscribe(address, queue)
@@ -0,0 +1,222 @@
+import json
+import shutil
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.benchmark import (
+    RpcRecorder,
+    deploy_contract,
+    drive,
+    free_port,
+    start_django,
+    start_ganache,
+    summarize,
+    wait_until,
+)
+
+SCENARIOS = ["register", "balance", "accounts", "transfer", "mint-tokens"]
+PASSWORD = "benchmark-password"
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks the API against a throwaway ganache chain and database and "
+        "reports throughput, latency percentiles and RPC calls per request as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=50)
+        parser.add_argument(
+            "--requests", type=int, default=200, help="Requests per scenario."
+        )
+        parser.add_argument("--concurrency", type=int, default=10)
+        parser.add_argument(
+            "--scenarios",
+            nargs="+",
+            choices=SCENARIOS,
+            default=SCENARIOS,
+            help="register always runs, since it seeds the users.",
+        )
+        parser.add_argument(
+            "--rpc-url", help="Use this node instead of starting ganache."
+        )
+        parser.add_argument(
+            "--contract", help="Use this VirtualCurrency address instead of deploying."
+        )
+        parser.add_argument("--ganache-cmd", default="npx ganache")
+        parser.add_argument("--build", default=settings.CONTRACT_PATH)
+        parser.add_argument(
+            "--outbox-workers", type=int, default=settings.OUTBOX_WORKERS
+        )
+        parser.add_argument("--drain-timeout", type=float, default=300)
+        parser.add_argument("--output", help="Write the JSON report to this file.")
+
+    def handle(self, *args, **options):
+        workdir = tempfile.mkdtemp(prefix="vc-benchmark-")
+        processes = []
+        recorder = None
+        try:
+            node_url = options["rpc_url"]
+            if node_url is None:
+                ganache, node_url = start_ganache(
+                    options["ganache_cmd"],
+                    free_port(),
+                    settings.CENTRAL_ACCOUNT_PRIVATE_KEY,
+                )
+                processes.append(ganache)
+            contract = options["contract"] or deploy_contract(
+                node_url, options["build"], settings.CENTRAL_ACCOUNT_PRIVATE_KEY
+            )
+
+            recorder = RpcRecorder(node_url)
+            env = {
+                "DJANGO_SETTINGS_MODULE": "djangoProject.benchmark_settings",
+                "BENCHMARK_DB": f"{workdir}/db.sqlite3",
+                "BENCHMARK_RPC": recorder.start(),
+                "BENCHMARK_CONTRACT": contract,
+            }
+            migrate = start_django(["migrate", "--run-syncdb", "--verbosity", "0"], env)
+            if migrate.wait() != 0:
+                raise CommandError("Could not create the benchmark database.")
+            port = free_port()
+            processes.append(
+                start_django(["runserver", f"127.0.0.1:{port}", "--noreload"], env)
+            )
+            processes.append(
+                start_django(
+                    ["run_outbox", "--workers", str(options["outbox_workers"])], env
+                )
+            )
+            base_url = f"http://127.0.0.1:{port}"
+            wait_until(
+                lambda: requests.get(f"{base_url}/login/").status_code,
+                60,
+                "the API server",
+            )
+
+            report = {
+                "commit": self.current_commit(),
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "config": {
+                    key: options[key]
+                    for key in ("users", "requests", "concurrency", "outbox_workers")
+                },
+                "scenarios": {},
+            }
+            users = []
+            for name in SCENARIOS:
+                if name != "register" and name not in options["scenarios"]:
+                    continue
+                count = options["users"] if name == "register" else options["requests"]
+                send = self.scenario(name, base_url, users)
+                report["scenarios"][name], results = self.measure(
+                    recorder, base_url, send, count, options
+                )
+                if name == "register":
+                    users = [
+                        (body["username"], body["token"])
+                        for _, _, body in results
+                        if "token" in body
+                    ]
+                    if not users:
+                        raise CommandError("No benchmark user could register.")
+                self.stderr.write(f"Finished {name}.")
+        finally:
+            for process in reversed(processes):
+                process.terminate()
+                process.wait()
+            if recorder is not None:
+                recorder.stop()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                f.write(output + "\n")
+        self.stdout.write(output)
+
+    def scenario(self, name, base_url, users):
+        """Returns send(session, i) issuing the i-th request of a scenario."""
+
+        def auth(i):
+            return {"Authorization": f"Token {users[i % len(users)][1]}"}
+
+        if name == "register":
+            prefix = f"bench{int(time.time())}_"
+            return lambda session, i: session.post(
+                f"{base_url}/register/",
+                json={"username": f"{prefix}{i}", "password": PASSWORD},
+            )
+        if name == "balance":
+            return lambda session, i: session.get(
+                f"{base_url}/balance/", headers=auth(i)
+            )
+        if name == "accounts":
+            return lambda session, i: session.get(
+                f"{base_url}/accounts/", params={"limit": 100}, headers=auth(i)
+            )
+        if name == "transfer":
+            return lambda session, i: session.post(
+                f"{base_url}/transfer/",
+                json={
+                    "to_username": users[(i + 1) % len(users)][0],
+                    "amount": "0.001",
+                },
+                headers=auth(i),
+            )
+        return lambda session, i: session.post(
+            f"{base_url}/mint-tokens/",
+            json={"recipient_username": users[i % len(users)][0], "amount": "1"},
+        )
+
+    def measure(self, recorder, base_url, send, count, options):
+        """
+        Runs one scenario and waits for the outbox to submit the jobs it
+        queued, so RPC calls made by the workers are counted against it.
+        """
+        calls_before, round_trips_before = recorder.snapshot()
+        elapsed, results = drive(send, count, options["concurrency"])
+        job_ids = [body["job_id"] for _, _, body in results if "job_id" in body]
+        drain_seconds = self.drain(base_url, job_ids, options["drain_timeout"])
+        calls_after, round_trips_after = recorder.snapshot()
+
+        summary = summarize(
+            elapsed,
+            results,
+            calls_after - calls_before,
+            round_trips_after - round_trips_before,
+        )
+        summary["drain_seconds"] = drain_seconds
+        return summary, results
+
+    def drain(self, base_url, job_ids, timeout):
+        started = time.monotonic()
+        pending = set(job_ids)
+        with requests.Session() as session:
+            while pending:
+                if time.monotonic() - started > timeout:
+                    raise CommandError(f"{len(pending)} outbox jobs did not finish.")
+                for job_id in list(pending):
+                    job = session.get(f"{base_url}/jobs/{job_id}/").json()
+                    if job["status"] in ("submitted", "failed"):
+                        pending.discard(job_id)
+                if pending:
+                    time.sleep(0.2)
+        return round(time.monotonic() - started, 3)
+
+    def current_commit(self):
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "HEAD"],
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
@@ -0,0 +1,117 @@
+import json
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils.text import compress_string
+from eth_account import Account
+from rest_framework.renderers import JSONRenderer
+from web3 import Web3
+
+from api.compression import BROTLI_QUALITY, brotli
+from api.renderers import ORJSONRenderer, format_wei
+
+
+def best_time(fn, repeat):
+    """Returns the fastest of `repeat` runs of fn, in seconds, and its result."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures building, rendering and compressing an account listing with "
+        "the stdlib JSON renderer and Web3.from_wei against orjson and format_wei."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=10000)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--output", help="Write the JSON report to this file.")
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        users = [
+            (i, f"user{i}", Account.create().address)
+            for i in range(1, options["count"] + 1)
+        ]
+        balances = {
+            address: (rng.randrange(10**20), rng.randrange(10**21))
+            for _, _, address in users
+        }
+
+        def listing(format_amount):
+            return {
+                "accounts": [
+                    {
+                        "id": user_id,
+                        "username": username,
+                        "wallet_address": address,
+                        "ether_balance": format_amount(balances[address][0]),
+                        "token_balance": format_amount(balances[address][1]),
+                    }
+                    for user_id, username, address in users
+                ],
+                "next_cursor": None,
+                "block_number": 123456,
+            }
+
+        renderers = {
+            "stdlib": (
+                lambda value: str(Web3.from_wei(value, "ether")),
+                JSONRenderer(),
+            ),
+            "orjson": (format_wei, ORJSONRenderer()),
+        }
+        results = {}
+        for name, (format_amount, renderer) in renderers.items():
+            build_seconds, data = best_time(
+                lambda: listing(format_amount), options["repeat"]
+            )
+            render_seconds, content = best_time(
+                lambda: renderer.render(data), options["repeat"]
+            )
+            results[name] = {
+                "build_seconds": round(build_seconds, 4),
+                "render_seconds": round(render_seconds, 4),
+                "bytes": len(content),
+            }
+            self.stderr.write(
+                f"{name}: built in {build_seconds * 1000:.1f} ms, "
+                f"rendered in {render_seconds * 1000:.1f} ms"
+            )
+        stdlib, fast = results["stdlib"], results["orjson"]
+        results["speedup"] = round(
+            (stdlib["build_seconds"] + stdlib["render_seconds"])
+            / (fast["build_seconds"] + fast["render_seconds"]),
+            2,
+        )
+
+        compression = {}
+        encoders = {"gzip": lambda: compress_string(content)}
+        if brotli is not None:
+            encoders["br"] = lambda: brotli.compress(content, quality=BROTLI_QUALITY)
+        for encoding, compress in encoders.items():
+            seconds, compressed = best_time(compress, options["repeat"])
+            compression[encoding] = {
+                "seconds": round(seconds, 4),
+                "bytes": len(compressed),
+                "ratio": round(len(content) / len(compressed), 2),
+            }
+
+        output = json.dumps(
+            {
+                "accounts": len(users),
+                "rendering": results,
+                "compression": compression,
+            },
+            indent=2,
+        )
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                f.write(output + "\n")
+        self.stdout.write(output)
@@ -0,0 +1,104 @@
+import json
+import os
+import secrets
+import time
+
+from django.core.management.base import BaseCommand
+from eth_account import Account
+
+from api.signing import SigningEngine, backend_name
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures signatures per second for inline signing and growing process pools."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=2000)
+        parser.add_argument(
+            "--keys", type=int, default=100, help="Distinct signing keys."
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            nargs="+",
+            help="Pool sizes to try (default: powers of two up to the CPU count).",
+        )
+        parser.add_argument(
+            "--kind", choices=["transaction", "permit"], default="transaction"
+        )
+        parser.add_argument("--output", help="Write the JSON report to this file.")
+
+    def handle(self, *args, **options):
+        cpus = os.cpu_count() or 1
+        workers = options["workers"] or sorted(
+            {1, cpus, *(2**i for i in range(cpus.bit_length()) if 2**i <= cpus)}
+        )
+        keys = [Account.create().key.hex() for _ in range(options["keys"])]
+        if options["kind"] == "transaction":
+            items = [
+                (
+                    {
+                        "to": "0x" + "11" * 20,
+                        "value": 0,
+                        "data": "0x",
+                        "gas": 200000,
+                        "gasPrice": 0,
+                        "nonce": i,
+                        "chainId": 1337,
+                    },
+                    keys[i % len(keys)],
+                )
+                for i in range(options["count"])
+            ]
+        else:
+            items = [
+                (keys[i % len(keys)], secrets.token_bytes(32))
+                for i in range(options["count"])
+            ]
+
+        results = []
+        for size in workers:
+            engine = SigningEngine(size, min_batch=1)
+            sign = (
+                engine.sign_transactions
+                if options["kind"] == "transaction"
+                else engine.sign_digests
+            )
+            # Start the workers and derive every key before timing.
+            sign(items[: len(keys) * size])
+            started = time.perf_counter()
+            sign(items)
+            elapsed = time.perf_counter() - started
+            engine.shutdown()
+            results.append(
+                {
+                    "workers": size,
+                    "seconds": round(elapsed, 3),
+                    "signatures_per_second": round(len(items) / elapsed, 1),
+                }
+            )
+            self.stderr.write(
+                f"{size} workers: {results[-1]['signatures_per_second']} signatures/s"
+            )
+        for result in results:
+            result["speedup"] = round(
+                result["signatures_per_second"] / results[0]["signatures_per_second"],
+                2,
+            )
+
+        output = json.dumps(
+            {
+                "kind": options["kind"],
+                "backend": backend_name(),
+                "cpu_count": cpus,
+                "count": len(items),
+                "results": results,
+            },
+            indent=2,
+        )
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                f.write(output + "\n")
+        self.stdout.write(output)
@@ -0,0 +1,247 @@
+import csv
+import multiprocessing
+import os
+import random
+import secrets
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from eth_account import Account
+from rest_framework.authtoken.models import Token
+
+from api.models import CustomUser, OutboxJob
+from api.outbox import EXTERNAL_CLAIM_PREFIX, external_claim, reconcile_external
+from api.utils import bulk_fund_accounts
+
+
+def provision(rows):
+    """
+    Creates a wallet and hashes the password for each (username, password)
+    row, the way CustomUserManager.create_user does. Runs in pool workers.
+    """
+    users = []
+    for username, password in rows:
+        account = Account.create(secrets.token_hex(16))
+        users.append(
+            (username, account.address, account.key.hex(), make_password(password))
+        )
+    return users
+
+
+class Command(BaseCommand):
+    help = (
+        "Registers and funds the users in a CSV file with username and password "
+        "columns and an optional amount column in VC. Safe to re-run: existing "
+        "users are skipped and only unfunded wallets are funded."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("csv_file")
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--no-fund", action="store_true", help="Only create the users."
+        )
+
+    def handle(self, *args, **options):
+        rows = self.read_rows(options["csv_file"])
+        workers = options["workers"]
+        started = time.monotonic()
+        created = funded = failed = 0
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=django.setup,
+        ) as pool:
+            for start in range(0, len(rows), options["batch_size"]):
+                batch = rows[start : start + options["batch_size"]]
+                created += self.create_users(pool, workers, batch)
+                if not options["no_fund"]:
+                    batch_funded, batch_failed = self.fund_users(batch)
+                    funded += batch_funded
+                    failed += batch_failed
+                done = start + len(batch)
+                rate = done / (time.monotonic() - started)
+                self.stdout.write(
+                    f"Processed {done}/{len(rows)} users ({rate:.1f} users/s): "
+                    f"{created} created, {funded} funded, {failed} funding failures."
+                )
+
+    def read_rows(self, path):
+        """Returns (username, password, amount_in_wei) rows, deduplicated."""
+        rows = {}
+        with open(path, newline="", encoding="utf-8") as f:
+            reader = csv.DictReader(f)
+            if not {"username", "password"} <= set(reader.fieldnames or []):
+                raise CommandError("The CSV needs username and password columns.")
+            for row in reader:
+                username = row["username"].strip()
+                if not username or not row["password"]:
+                    continue
+                amount = (row.get("amount") or "").strip()
+                try:
+                    amount_in_vc = int(amount) if amount else random.randint(100, 1000)
+                except ValueError:
+                    raise CommandError(
+                        f"Line {reader.line_num}: amount {amount!r} is not a whole "
+                        "number of VC."
+                    )
+                rows[username] = (username, row["password"], amount_in_vc * (10**18))
+        return list(rows.values())
+
+    def create_users(self, pool, workers, batch):
+        usernames = [username for username, _, _ in batch]
+        existing = set(
+            CustomUser.objects.filter(username__in=usernames).values_list(
+                "username", flat=True
+            )
+        )
+        new_rows = [
+            (username, password)
+            for username, password, _ in batch
+            if username not in existing
+        ]
+        if not new_rows:
+            return 0
+
+        chunk_size = -(-len(new_rows) // workers)
+        chunks = [
+            new_rows[start : start + chunk_size]
+            for start in range(0, len(new_rows), chunk_size)
+        ]
+        provisioned = [user for chunk in pool.map(provision, chunks) for user in chunk]
+        with transaction.atomic():
+            users = CustomUser.objects.bulk_create(
+                [
+                    CustomUser(
+                        username=username,
+                        wallet_address=wallet_address,
+                        private_key=private_key,
+                        password=password,
+                    )
+                    for username, wallet_address, private_key, password in provisioned
+                ]
+            )
+            if any(user.pk is None for user in users):
+                users = list(
+                    CustomUser.objects.filter(
+                        username__in=[username for username, _ in new_rows]
+                    )
+                )
+            Token.objects.bulk_create(
+                [Token(key=Token.generate_key(), user=user) for user in users]
+            )
+        return len(users)
+
+    def fund_users(self, batch):
+        """
+        Funds every wallet in the batch that has no pending, processing or
+        submitted funding job yet, with one pipelined run of transfers. The
+        jobs are written as PROCESSING under an external claim before
+        anything is sent, and get their transaction hash once signed. The
+        outbox never re-sends such jobs; if the run crashes or the
+        submission fails partway, the jobs are reconciled against the chain
+        instead, here or on the next run once OUTBOX_CLAIM_TIMEOUT passes.
+        """
+        amounts = {username: amount for username, _, amount in batch}
+        users = CustomUser.objects.filter(username__in=list(amounts)).only(
+            "username", "wallet_address"
+        )
+        addresses = [user.wallet_address for user in users]
+        self.reconcile_stale(addresses)
+        funded = set(
+            OutboxJob.objects.filter(
+                kind=OutboxJob.Kind.FUND,
+                recipient_address__in=addresses,
+                status__in=[
+                    OutboxJob.Status.PENDING,
+                    OutboxJob.Status.PROCESSING,
+                    OutboxJob.Status.SUBMITTED,
+                ],
+            ).values_list("recipient_address", flat=True)
+        )
+        recipients = [
+            (user.wallet_address, amounts[user.username])
+            for user in users
+            if user.wallet_address not in funded
+        ]
+        if not recipients:
+            return 0, 0
+
+        claim = external_claim()
+        OutboxJob.objects.bulk_create(
+            [
+                OutboxJob(
+                    kind=OutboxJob.Kind.FUND,
+                    status=OutboxJob.Status.PROCESSING,
+                    recipient_address=address,
+                    amount=amount,
+                    claimed_by=claim,
+                )
+                for address, amount in recipients
+            ]
+        )
+        jobs = {
+            job.recipient_address: job
+            for job in OutboxJob.objects.filter(claimed_by=claim)
+        }
+
+        def record_hashes(tx_hashes):
+            for (address, _), tx_hash in zip(recipients, tx_hashes):
+                jobs[address].tx_hash = tx_hash
+            OutboxJob.objects.bulk_update(jobs.values(), ["tx_hash"])
+
+        try:
+            results = bulk_fund_accounts(
+                settings.CENTRAL_ACCOUNT_PRIVATE_KEY,
+                recipients,
+                on_signed=record_hashes,
+            )
+        except Exception:
+            # Some transfers may have reached the node before the failure.
+            try:
+                reconcile_external(jobs.values())
+            except Exception as e:
+                self.stderr.write(
+                    f"Could not reconcile funding jobs {claim}, will retry: {e}"
+                )
+            raise
+        self.record_funding(jobs, recipients, results)
+        failed = sum(1 for tx_hash, _ in results if not tx_hash)
+        return len(results) - failed, failed
+
+    def reconcile_stale(self, addresses):
+        """Settles funding jobs for `addresses` left by a crashed run."""
+        stale = OutboxJob.objects.filter(
+            kind=OutboxJob.Kind.FUND,
+            recipient_address__in=addresses,
+            status=OutboxJob.Status.PROCESSING,
+            claimed_by__startswith=EXTERNAL_CLAIM_PREFIX,
+            updated_at__lt=timezone.now()
+            - timedelta(seconds=settings.OUTBOX_CLAIM_TIMEOUT),
+        )
+        reconcile_external(list(stale))
+
+    def record_funding(self, jobs, recipients, results):
+        now = timezone.now()
+        for (address, _), (tx_hash, error) in zip(recipients, results):
+            job = jobs[address]
+            job.status = (
+                OutboxJob.Status.SUBMITTED if tx_hash else OutboxJob.Status.FAILED
+            )
+            job.attempts = 1
+            job.tx_hash = tx_hash or ""
+            job.error = error or ""
+            job.claimed_by = ""
+            job.updated_at = now
+        OutboxJob.objects.bulk_update(
+            jobs.values(),
+            ["status", "attempts", "tx_hash", "error", "claimed_by", "updated_at"],
+        )
@@ -0,0 +1,34 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.indexer import get_checkpoint, index_new_blocks
+
+
+class Command(BaseCommand):
+    help = "Follows new blocks and indexes VirtualCurrency Transfer, Mint and Approval events."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size", type=int, default=settings.INDEXER_CHUNK_SIZE
+        )
+        parser.add_argument(
+            "--confirmations", type=int, default=settings.INDEXER_CONFIRMATIONS
+        )
+        parser.add_argument("--poll-interval", type=float, default=2.0)
+        parser.add_argument(
+            "--once", action="store_true", help="Catch up to the head and exit."
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            ingested = index_new_blocks(options["chunk_size"], options["confirmations"])
+            if ingested:
+                checkpoint = get_checkpoint()
+                self.stdout.write(
+                    f"Indexed {ingested} events up to block {checkpoint.block_number}."
+                )
+            if options["once"]:
+                return
+            time.sleep(options["poll_interval"])
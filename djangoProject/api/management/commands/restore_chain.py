@@ -0,0 +1,62 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.snapshots import (
+    SnapshotError,
+    check_contract,
+    load_manifest,
+    reset_offchain_state,
+    revert_chain,
+    seed_users,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Resets the node to the snapshot in CHAIN_MANIFEST and creates the "
+        "funded users recorded with it. Off-chain state that refers to the "
+        "discarded blocks is cleared, so stop the outbox, receipt, indexer and "
+        "ledger workers first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--manifest", default=settings.CHAIN_MANIFEST)
+        parser.add_argument(
+            "--no-revert",
+            action="store_true",
+            help="Keep the chain as it is, e.g. right after restarting "
+            "ganache from the saved database.",
+        )
+        parser.add_argument(
+            "--no-users", action="store_true", help="Do not create the users."
+        )
+
+    def handle(self, *args, **options):
+        try:
+            # A failed revert rolls the off-chain reset back with it.
+            with transaction.atomic():
+                reset_offchain_state()
+                if options["no_revert"]:
+                    manifest = load_manifest(options["manifest"])
+                else:
+                    manifest = revert_chain(options["manifest"])
+                    self.stdout.write(
+                        f"Reverted the chain to the snapshot taken at block "
+                        f"{manifest['block_number']}."
+                    )
+            check_contract(manifest)
+        except (OSError, SnapshotError) as e:
+            raise CommandError(str(e))
+        self.stdout.write(
+            "Cleared nonce counters, the event index, tracked and unfinished "
+            "outbox transactions and the ledger."
+        )
+
+        if not options["no_users"]:
+            users = manifest.get("users", [])
+            created = seed_users(users)
+            self.stdout.write(
+                f"Created {created} of {len(users)} snapshot users "
+                f"({len(users) - created} already existed)."
+            )
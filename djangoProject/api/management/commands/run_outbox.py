@@ -0,0 +1,60 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from api.outbox import claim_batch, process_batch
+
+
+class Command(BaseCommand):
+    help = "Runs a pool of workers that sign and submit queued outbox transactions."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=settings.OUTBOX_WORKERS)
+        parser.add_argument(
+            "--batch-size", type=int, default=settings.OUTBOX_BATCH_SIZE
+        )
+        parser.add_argument("--poll-interval", type=float, default=1.0)
+        parser.add_argument(
+            "--once", action="store_true", help="Exit once the queue is drained."
+        )
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        workers = [
+            threading.Thread(
+                target=self.work,
+                args=(stop, options["batch_size"], options["poll_interval"]),
+                kwargs={"once": options["once"]},
+                daemon=True,
+            )
+            for _ in range(options["workers"])
+        ]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f"Started {len(workers)} outbox workers.")
+        try:
+            while any(worker.is_alive() for worker in workers):
+                time.sleep(0.5)
+        except KeyboardInterrupt:
+            stop.set()
+            for worker in workers:
+                worker.join()
+
+    def work(self, stop, batch_size, poll_interval, once=False):
+        try:
+            while not stop.is_set():
+                jobs = claim_batch(batch_size)
+                if not jobs:
+                    if once:
+                        return
+                    stop.wait(poll_interval)
+                    continue
+                for job in process_batch(jobs):
+                    self.stdout.write(
+                        f"Job {job.pk} ({job.kind}): {job.status} {job.tx_hash}"
+                    )
+        finally:
+            connection.close()
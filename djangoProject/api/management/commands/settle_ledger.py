@@ -0,0 +1,49 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.ledger import confirm_settlements, reconcile, settle
+
+
+class Command(BaseCommand):
+    help = (
+        "Pushes the net of all off-chain ledger transfers on-chain every "
+        "LEDGER_SETTLE_INTERVAL seconds. Run track_receipts alongside it so "
+        "idle accounts can be reconciled with the chain."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval", type=float, default=settings.LEDGER_SETTLE_INTERVAL
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=None,
+            help="Net transfers per transaction (default: LEDGER_SETTLE_BATCH).",
+        )
+        parser.add_argument("--once", action="store_true", help="Settle once and exit.")
+
+    def handle(self, *args, **options):
+        while True:
+            restored = confirm_settlements()
+            if restored:
+                self.stdout.write(
+                    f"Put {restored} legs that failed on-chain back into pending."
+                )
+            refreshed = reconcile()
+            if refreshed:
+                self.stdout.write(f"Reconciled {refreshed} idle accounts.")
+            settlement = settle(options["batch_size"])
+            if settlement is not None:
+                self.stdout.write(
+                    f"Settlement {settlement.id} {settlement.status}: "
+                    f"{settlement.transfers} transfers in "
+                    f"{len(settlement.tx_hashes)} transactions."
+                )
+                if settlement.error:
+                    self.stderr.write(settlement.error)
+            if options["once"]:
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.outbox import retry_failed_transfers
+from api.receipts import confirm_pending
+from api.utils import web3
+
+
+class Command(BaseCommand):
+    help = "Confirms tracked transaction hashes in bulk whenever a new block arrives."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=None,
+            help="Pending hashes looked up per block (default: all).",
+        )
+        parser.add_argument("--poll-interval", type=float, default=1.0)
+        parser.add_argument(
+            "--once", action="store_true", help="Check pending hashes once and exit."
+        )
+
+    def handle(self, *args, **options):
+        last_block = None
+        while True:
+            block_number = web3.eth.block_number
+            if block_number != last_block:
+                resolved = confirm_pending(options["batch_size"])
+                if resolved:
+                    self.stdout.write(
+                        f"Resolved {len(resolved)} transactions at block {block_number}."
+                    )
+                retried = retry_failed_transfers(resolved)
+                if retried:
+                    self.stdout.write(
+                        f"Rescheduled {len(retried)} transfer jobs that did not go through."
+                    )
+                last_block = block_number
+            if options["once"]:
+                return
+            time.sleep(options["poll_interval"])
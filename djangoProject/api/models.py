@@ -1,18 +1,45 @@
 import secrets
 
-from django.conf import settings
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.db import models
-from web3 import Web3
+from django.utils import timezone
+from eth_account import Account
 
-web3 = Web3(Web3.HTTPProvider(settings.WEB3_PROVIDER))
+
+class Uint256Field(models.CharField):
+    """
+    Stores token amounts in wei as decimal strings. SQLite's NUMERIC
+    columns fall back to floats above 64 bits, which would lose precision.
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs["max_length"] = 78
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        del kwargs["max_length"]
+        return name, path, args, kwargs
+
+    def from_db_value(self, value, expression, connection):
+        return self.to_python(value)
+
+    def to_python(self, value):
+        if value is None:
+            return value
+        return int(value)
+
+    def get_prep_value(self, value):
+        if value is None:
+            return value
+        return str(int(value))
 
 
 class CustomUserManager(BaseUserManager):
     def create_user(self, username, password, **extra_fields):
         if not username:
             raise ValueError("A username must be provided.")
-        account = web3.eth.account.create(secrets.token_hex(16))
+        account = Account.create(secrets.token_hex(16))
         extra_fields.setdefault("wallet_address", account.address)
         extra_fields.setdefault("private_key", account.key.hex())
         user = self.model(username=username, **extra_fields)
@@ -38,3 +65,239 @@ class CustomUser(AbstractUser):
 
     def __str__(self):
         return self.username
+
+
+class NonceCounter(models.Model):
+    address = models.CharField(max_length=42, unique=True)
+    next_nonce = models.PositiveBigIntegerField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.address}: {self.next_nonce}"
+
+
+class ReleasedNonce(models.Model):
+    """A nonce below NonceCounter.next_nonce that was reserved but never sent."""
+
+    address = models.CharField(max_length=42)
+    nonce = models.PositiveBigIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["address", "nonce"], name="unique_released_nonce"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.address}: {self.nonce}"
+
+
+class OutboxJob(models.Model):
+    class Kind(models.TextChoices):
+        FUND = "fund"
+        TRANSFER = "transfer"
+        MINT = "mint"
+
+    class Status(models.TextChoices):
+        PENDING = "pending"
+        PROCESSING = "processing"
+        SUBMITTED = "submitted"
+        FAILED = "failed"
+
+    kind = models.CharField(max_length=16, choices=Kind.choices)
+    status = models.CharField(
+        max_length=16, choices=Status.choices, default=Status.PENDING
+    )
+    sender = models.ForeignKey(
+        CustomUser, null=True, blank=True, on_delete=models.CASCADE, related_name="+"
+    )
+    recipient_address = models.CharField(max_length=42)
+    amount = Uint256Field()
+    attempts = models.PositiveIntegerField(default=0)
+    claimed_by = models.CharField(max_length=32, blank=True)
+    tx_hash = models.CharField(max_length=66, blank=True)
+    # Position of a transfer in its batchPermitTransferFrom call.
+    batch_index = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    available_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "available_at"])]
+
+    def __str__(self):
+        return f"{self.kind} job {self.pk} ({self.status})"
+
+
+class TokenEvent(models.Model):
+    class Name(models.TextChoices):
+        TRANSFER = "Transfer"
+        MINT = "Mint"
+        APPROVAL = "Approval"
+
+    event = models.CharField(max_length=16, choices=Name.choices)
+    block_number = models.PositiveBigIntegerField(db_index=True)
+    block_hash = models.CharField(max_length=66)
+    transaction_hash = models.CharField(max_length=66)
+    log_index = models.PositiveIntegerField()
+    from_address = models.CharField(max_length=42, blank=True, db_index=True)
+    to_address = models.CharField(max_length=42, db_index=True)
+    value = Uint256Field()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["transaction_hash", "log_index"], name="unique_token_event"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.event} {self.transaction_hash}:{self.log_index}"
+
+
+class TokenBalance(models.Model):
+    address = models.CharField(max_length=42, unique=True)
+    balance = Uint256Field()
+    opening_balance = Uint256Field()
+    opening_block = models.BigIntegerField()
+    updated_block = models.BigIntegerField()
+
+    def __str__(self):
+        return f"{self.address}: {self.balance}"
+
+
+class IndexerCheckpoint(models.Model):
+    VIRTUAL_CURRENCY = "VirtualCurrency"
+
+    name = models.CharField(max_length=32, unique=True)
+    block_number = models.BigIntegerField()
+    block_hash = models.CharField(max_length=66, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} at block {self.block_number}"
+
+
+class TrackedTransaction(models.Model):
+    class Status(models.TextChoices):
+        PENDING = "pending"
+        CONFIRMED = "confirmed"
+        REVERTED = "reverted"
+        DROPPED = "dropped"
+
+    tx_hash = models.CharField(max_length=66, unique=True)
+    kind = models.CharField(max_length=16, choices=OutboxJob.Kind.choices)
+    status = models.CharField(
+        max_length=16, choices=Status.choices, default=Status.PENDING, db_index=True
+    )
+    block_number = models.BigIntegerField(null=True, blank=True)
+    block_hash = models.CharField(max_length=66, blank=True)
+    gas_used = models.PositiveBigIntegerField(null=True, blank=True)
+    # Positions of the batchPermitTransferFrom entries the contract skipped.
+    failed_transfers = models.JSONField(default=list, blank=True)
+    submitted_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.tx_hash} ({self.status})"
+
+
+class LedgerAccount(models.Model):
+    """
+    Off-chain VC balance of a user in ledger mode. chain_balance is the
+    on-chain balance as of the last settlement; pending_credit and
+    pending_debit are the unsettled ledger transfers in and out of it.
+    settlement is set while a settle run has claimed the account.
+    """
+
+    user = models.OneToOneField(
+        CustomUser, on_delete=models.CASCADE, related_name="ledger_account"
+    )
+    chain_balance = Uint256Field()
+    pending_credit = Uint256Field(default=0)
+    pending_debit = Uint256Field(default=0)
+    settlement = models.ForeignKey(
+        "LedgerSettlement",
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="+",
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def available(self):
+        return self.chain_balance + self.pending_credit - self.pending_debit
+
+    def __str__(self):
+        return f"{self.user}: {self.available}"
+
+
+class LedgerSettlement(models.Model):
+    class Status(models.TextChoices):
+        PENDING = "pending"
+        SUBMITTED = "submitted"
+        CONFIRMED = "confirmed"
+        FAILED = "failed"
+
+    status = models.CharField(
+        max_length=16, choices=Status.choices, default=Status.PENDING
+    )
+    transfers = models.PositiveIntegerField(default=0)
+    tx_hashes = models.JSONField(default=list)
+    # Submitted legs as {"debtor", "creditor", "amount", "tx_hash", "index"},
+    # kept until their transactions are confirmed.
+    legs = models.JSONField(default=list)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Settlement {self.pk} ({self.status})"
+
+
+class LedgerTransfer(models.Model):
+    sender = models.ForeignKey(
+        LedgerAccount, on_delete=models.CASCADE, related_name="+"
+    )
+    recipient = models.ForeignKey(
+        LedgerAccount, on_delete=models.CASCADE, related_name="+"
+    )
+    amount = Uint256Field()
+    settlement = models.ForeignKey(
+        LedgerSettlement,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="ledger_transfers",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.sender} -> {self.recipient}: {self.amount}"
+
+
+class LedgerEntry(models.Model):
+    """One side of a LedgerTransfer; the debit and credit always pair up."""
+
+    class Side(models.TextChoices):
+        DEBIT = "debit"
+        CREDIT = "credit"
+
+    account = models.ForeignKey(
+        LedgerAccount, on_delete=models.CASCADE, related_name="entries"
+    )
+    transfer = models.ForeignKey(
+        LedgerTransfer, on_delete=models.CASCADE, related_name="entries"
+    )
+    side = models.CharField(max_length=6, choices=Side.choices)
+    amount = Uint256Field()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["account", "created_at"])]
+
+    def __str__(self):
+        return f"{self.side} {self.amount} on {self.account}"
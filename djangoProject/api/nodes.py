@@ -0,0 +1,156 @@
+import random
+import threading
+import time
+
+import requests
+
+# Calls that must see the primary's own state: submissions, and the pending
+# nonce and receipt lookups that follow them.
+PRIMARY_METHODS = {
+    "eth_sendRawTransaction",
+    "eth_sendTransaction",
+    "eth_getTransactionCount",
+    "eth_getTransactionReceipt",
+    "eth_getTransactionByHash",
+    "evm_snapshot",
+    "evm_revert",
+}
+
+EWMA_ALPHA = 0.3
+
+
+class Node:
+    def __init__(self, url):
+        self.url = url
+        self.latency = None
+        self.healthy = True
+        self.failures = 0
+        self.successes = 0
+        self.block_number = None
+
+    def stats(self):
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "latency_ms": round(self.latency * 1000, 2) if self.latency else None,
+            "block_number": self.block_number,
+            "failures": self.failures,
+        }
+
+
+class NodePool:
+    """
+    Routes JSON-RPC traffic over several endpoints of the same chain. The
+    first endpoint is the primary and takes every call in PRIMARY_METHODS;
+    reads go to the faster of two random healthy nodes by EWMA latency.
+    A node is ejected after `eject_after` consecutive transport failures or
+    when it lags the best head by more than `max_lag` blocks, and is
+    readmitted after `readmit_after` clean health checks. Reads pinned to a
+    block go first to nodes whose last checked head has reached it.
+    """
+
+    def __init__(self, urls, eject_after, readmit_after, max_lag):
+        self.nodes = [Node(url) for url in urls]
+        self.primary = self.nodes[0]
+        self.eject_after = eject_after
+        self.readmit_after = readmit_after
+        self.max_lag = max_lag
+        self._lock = threading.Lock()
+        self._checker = None
+
+    def route(self, methods, min_block=None):
+        """
+        Returns the nodes to try, in order, for a request carrying `methods`.
+        Calls touching the primary are never retried elsewhere. With
+        `min_block`, nodes known to be behind it are moved to the end.
+        """
+        if len(self.nodes) == 1 or any(m in PRIMARY_METHODS for m in methods):
+            return [self.primary]
+        with self._lock:
+            healthy = [node for node in self.nodes if node.healthy]
+        if not healthy:
+            return [self.primary]
+        if len(healthy) > 1:
+            first, second = random.sample(healthy, 2)
+            if (second.latency or 0) < (first.latency or 0):
+                first, second = second, first
+            healthy.remove(first)
+            healthy.insert(0, first)
+        if min_block is not None:
+            healthy.sort(
+                key=lambda node: node.block_number is not None
+                and node.block_number < min_block
+            )
+        return healthy
+
+    def observe(self, node, seconds=None, ok=True):
+        with self._lock:
+            if not ok:
+                node.successes = 0
+                node.failures += 1
+                if node.failures >= self.eject_after:
+                    node.healthy = False
+                return
+            node.failures = 0
+            if seconds is not None:
+                node.latency = (
+                    seconds
+                    if node.latency is None
+                    else EWMA_ALPHA * seconds + (1 - EWMA_ALPHA) * node.latency
+                )
+
+    def check_health(self, session, timeout):
+        """Polls eth_blockNumber on every node and updates its health."""
+        for node in self.nodes:
+            started = time.perf_counter()
+            try:
+                response = session.post(
+                    node.url,
+                    json={
+                        "jsonrpc": "2.0",
+                        "id": 0,
+                        "method": "eth_blockNumber",
+                        "params": [],
+                    },
+                    timeout=timeout,
+                )
+                response.raise_for_status()
+                block_number = int(response.json()["result"], 16)
+            except (requests.RequestException, ValueError, KeyError):
+                self.observe(node, ok=False)
+                continue
+            self.observe(node, time.perf_counter() - started)
+            with self._lock:
+                node.block_number = block_number
+                node.successes += 1
+        with self._lock:
+            head = max(
+                (node.block_number for node in self.nodes if node.failures == 0),
+                default=None,
+            )
+            for node in self.nodes:
+                lagging = (
+                    head is not None
+                    and node.block_number is not None
+                    and head - node.block_number > self.max_lag
+                )
+                if lagging or node.failures >= self.eject_after:
+                    node.healthy = False
+                elif not node.healthy and node.successes >= self.readmit_after:
+                    node.healthy = True
+
+    def start_health_checks(self, session, interval, timeout):
+        if len(self.nodes) == 1 or self._checker is not None:
+            return
+
+        def run():
+            while True:
+                self.check_health(session, timeout)
+                time.sleep(interval)
+
+        self._checker = threading.Thread(target=run, daemon=True)
+        self._checker.start()
+
+    def stats(self):
+        with self._lock:
+            return [node.stats() for node in self.nodes]
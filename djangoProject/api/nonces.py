@@ -0,0 +1,120 @@
+import threading
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from web3 import Web3
+
+from .models import NonceCounter, ReleasedNonce
+
+
+class NonceManager:
+    """
+    Hands out transaction nonces per address from a NonceCounter row instead
+    of asking the node every time. The counter is bumped with a single
+    UPDATE inside a transaction, so concurrent threads and processes never
+    receive the same nonce. Nonces given back by resync are kept as
+    ReleasedNonce rows, so whichever process allocates next fills the gap.
+    """
+
+    def __init__(self, web3):
+        self.web3 = web3
+        self._lock = threading.Lock()
+
+    def allocate(self, address, count=1):
+        """Reserves `count` consecutive nonces and returns the first one."""
+        address = Web3.to_checksum_address(address)
+        with self._lock, transaction.atomic():
+            if count == 1:
+                nonce = self._claim_released(address)
+                if nonce is not None:
+                    return nonce
+            updated = NonceCounter.objects.filter(address=address).update(
+                next_nonce=F("next_nonce") + count
+            )
+            if not updated:
+                pending = self.web3.eth.get_transaction_count(address, "pending")
+                try:
+                    with transaction.atomic():
+                        NonceCounter.objects.create(
+                            address=address, next_nonce=pending + count
+                        )
+                    return pending
+                except IntegrityError:
+                    NonceCounter.objects.filter(address=address).update(
+                        next_nonce=F("next_nonce") + count
+                    )
+            next_nonce = NonceCounter.objects.values_list("next_nonce", flat=True).get(
+                address=address
+            )
+            return next_nonce - count
+
+    def _claim_released(self, address):
+        """
+        Takes the lowest released nonce of `address`. The row is claimed by
+        deleting it, so a concurrent allocation that picked the same one
+        deletes nothing and moves on.
+        """
+        released = ReleasedNonce.objects.filter(address=address).order_by("nonce")
+        for pk, nonce in released.values_list("pk", "nonce")[:5]:
+            if ReleasedNonce.objects.filter(pk=pk).delete()[0]:
+                return nonce
+        return None
+
+    def resync(self, address, nonces):
+        """
+        Gives back `nonces`, reserved by allocate but never sent, so they do
+        not leave a gap that blocks later transactions. The counter only
+        moves back over unsent nonces directly below it; a nonce that
+        another caller has already allocated past is stored as a
+        ReleasedNonce and handed out by the next single-nonce allocation in
+        any process. The counter is also moved forward to the node's
+        pending count if it is behind, and released nonces below that count
+        are dropped.
+        """
+        address = Web3.to_checksum_address(address)
+        pending = self.web3.eth.get_transaction_count(address, "pending")
+        with self._lock, transaction.atomic():
+            next_nonce = (
+                NonceCounter.objects.select_for_update()
+                .filter(address=address)
+                .values_list("next_nonce", flat=True)
+                .first()
+            )
+            if next_nonce is None:
+                next_nonce = pending
+            released = dict(
+                ReleasedNonce.objects.select_for_update()
+                .filter(address=address)
+                .values_list("nonce", "pk")
+            )
+            unsent = sorted(
+                nonce
+                for nonce in set(nonces) | set(released)
+                if pending <= nonce < next_nonce
+            )
+            while unsent and unsent[-1] == next_nonce - 1:
+                next_nonce = unsent.pop()
+            next_nonce = max(next_nonce, pending)
+            NonceCounter.objects.update_or_create(
+                address=address, defaults={"next_nonce": next_nonce}
+            )
+            ReleasedNonce.objects.filter(
+                pk__in=[pk for nonce, pk in released.items() if nonce not in unsent]
+            ).delete()
+            ReleasedNonce.objects.bulk_create(
+                [
+                    ReleasedNonce(address=address, nonce=nonce)
+                    for nonce in unsent
+                    if nonce not in released
+                ],
+                ignore_conflicts=True,
+            )
+        return next_nonce
+
+    def released(self, address):
+        """Returns the nonces of `address` waiting to be handed out again."""
+        return list(
+            ReleasedNonce.objects.filter(address=Web3.to_checksum_address(address))
+            .order_by("nonce")
+            .values_list("nonce", flat=True)
+        )
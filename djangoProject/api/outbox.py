@@ -0,0 +1,236 @@
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import OutboxJob, TrackedTransaction
+from .provider import rpc_batch_replies
+from .receipts import track
+from .utils import fund_account, mint_tokens, perform_transfer, perform_transfers
+
+
+# Claims taken outside the outbox workers (bulk_register sends its own
+# transactions). Their outcome is unknown after a crash, so claim_batch never
+# releases them for a re-send; reconcile_external checks the chain instead.
+EXTERNAL_CLAIM_PREFIX = "external-"
+
+
+class OutboxFull(Exception):
+    pass
+
+
+def enqueue(kind, recipient_address, amount, sender=None):
+    """
+    Records a transaction intent for the submitter workers. Raises OutboxFull
+    when the backlog is over OUTBOX_MAX_PENDING so callers can shed load.
+    """
+    backlog = OutboxJob.objects.filter(
+        status__in=[OutboxJob.Status.PENDING, OutboxJob.Status.PROCESSING]
+    ).count()
+    if backlog >= settings.OUTBOX_MAX_PENDING:
+        raise OutboxFull("Transaction queue is full, try again later.")
+    return OutboxJob.objects.create(
+        kind=kind,
+        sender=sender,
+        recipient_address=recipient_address,
+        amount=amount,
+    )
+
+
+def claim_batch(size):
+    """
+    Marks up to `size` due jobs as processing for this worker and returns
+    them. The status filter on the UPDATE makes the claim safe between
+    concurrent workers; jobs left processing by a crashed worker are
+    released again after OUTBOX_CLAIM_TIMEOUT seconds.
+    """
+    now = timezone.now()
+    OutboxJob.objects.filter(
+        status=OutboxJob.Status.PROCESSING,
+        updated_at__lt=now - timedelta(seconds=settings.OUTBOX_CLAIM_TIMEOUT),
+    ).exclude(claimed_by__startswith=EXTERNAL_CLAIM_PREFIX).update(
+        status=OutboxJob.Status.PENDING, claimed_by=""
+    )
+
+    claim = uuid.uuid4().hex
+    ids = list(
+        OutboxJob.objects.filter(status=OutboxJob.Status.PENDING, available_at__lte=now)
+        .order_by("id")
+        .values_list("id", flat=True)[:size]
+    )
+    OutboxJob.objects.filter(id__in=ids, status=OutboxJob.Status.PENDING).update(
+        status=OutboxJob.Status.PROCESSING, claimed_by=claim, updated_at=now
+    )
+    return list(
+        OutboxJob.objects.filter(claimed_by=claim)
+        .select_related("sender")
+        .order_by("id")
+    )
+
+
+def external_claim():
+    return EXTERNAL_CLAIM_PREFIX + uuid.uuid4().hex[:23]
+
+
+def reconcile_external(jobs):
+    """
+    Settles externally claimed jobs whose submission outcome is unknown by
+    asking the node for their signed transactions: a transaction the node
+    knows becomes SUBMITTED and is tracked, one it has never seen (or a job
+    that was never signed) becomes FAILED. Jobs the node could not answer
+    for stay PROCESSING. Returns the number of jobs settled.
+    """
+    jobs = [job for job in jobs if job.status == OutboxJob.Status.PROCESSING]
+    signed = [job for job in jobs if job.tx_hash]
+    replies = rpc_batch_replies(
+        [("eth_getTransactionByHash", [job.tx_hash]) for job in signed]
+    )
+    known = {
+        job.pk: reply["result"] is not None
+        for job, reply in zip(signed, replies)
+        if "error" not in reply
+    }
+    now = timezone.now()
+    settled = []
+    for job in jobs:
+        if job.tx_hash and job.pk not in known:
+            continue
+        if known.get(job.pk):
+            job.status = OutboxJob.Status.SUBMITTED
+            job.error = ""
+        else:
+            job.status = OutboxJob.Status.FAILED
+            job.error = "Never reached the node."
+        job.claimed_by = ""
+        job.updated_at = now
+        settled.append(job)
+    OutboxJob.objects.bulk_update(
+        settled, ["status", "error", "claimed_by", "updated_at"]
+    )
+    for job in settled:
+        if job.status == OutboxJob.Status.SUBMITTED:
+            track(job.kind, job.tx_hash)
+    return len(settled)
+
+
+def submit(job):
+    central_private_key = settings.CENTRAL_ACCOUNT_PRIVATE_KEY
+    amount = job.amount
+    if job.kind == OutboxJob.Kind.FUND:
+        return fund_account(central_private_key, job.recipient_address, amount)
+    if job.kind == OutboxJob.Kind.TRANSFER:
+        return perform_transfer(
+            central_private_key,
+            job.sender.wallet_address,
+            job.recipient_address,
+            amount,
+            job.sender.private_key,
+        )
+    if job.kind == OutboxJob.Kind.MINT:
+        return mint_tokens(central_private_key, job.recipient_address, amount)
+    raise ValueError(f"Unknown job kind: {job.kind}")
+
+
+def record_result(job, tx_hash=None, error=None):
+    """Stores the outcome of one attempt, scheduling a retry on failure."""
+    job.attempts += 1
+    if error is None:
+        job.tx_hash = tx_hash
+        job.status = OutboxJob.Status.SUBMITTED
+        job.error = ""
+    else:
+        job.error = error
+        if job.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+            job.status = OutboxJob.Status.FAILED
+        else:
+            job.status = OutboxJob.Status.PENDING
+            job.available_at = timezone.now() + timedelta(
+                seconds=min(2**job.attempts, settings.OUTBOX_MAX_BACKOFF)
+            )
+    job.claimed_by = ""
+    job.save(
+        update_fields=[
+            "attempts",
+            "tx_hash",
+            "batch_index",
+            "status",
+            "error",
+            "available_at",
+            "claimed_by",
+            "updated_at",
+        ]
+    )
+    return job
+
+
+def process_job(job):
+    """Submits one claimed job and records the tx hash or schedules a retry."""
+    try:
+        return record_result(job, tx_hash=submit(job))
+    except Exception as e:
+        return record_result(job, error=str(e))
+
+
+def process_batch(jobs):
+    """
+    Submits a claimed batch. All transfer jobs in it are settled together
+    in one batchPermitTransferFrom transaction and share its tx hash.
+    """
+    transfers = [job for job in jobs if job.kind == OutboxJob.Kind.TRANSFER]
+    for index, job in enumerate(transfers):
+        job.batch_index = index if len(transfers) > 1 else 0
+    if len(transfers) > 1:
+        try:
+            tx_hash = perform_transfers(
+                settings.CENTRAL_ACCOUNT_PRIVATE_KEY,
+                [
+                    (
+                        job.sender.wallet_address,
+                        job.recipient_address,
+                        job.amount,
+                        job.sender.private_key,
+                    )
+                    for job in transfers
+                ],
+            )
+            for job in transfers:
+                record_result(job, tx_hash=tx_hash)
+        except Exception as e:
+            for job in transfers:
+                record_result(job, error=str(e))
+        jobs = [job for job in jobs if job.kind != OutboxJob.Kind.TRANSFER]
+    return [process_job(job) for job in jobs] + transfers
+
+
+def retry_failed_transfers(transactions):
+    """
+    Takes transactions confirm_pending just resolved and reschedules, via
+    record_result, the submitted transfer jobs that did not happen: those
+    whose entry the contract skipped with PermitTransferFailed and all
+    jobs of a reverted or dropped transaction. Returns those jobs.
+    """
+    failed = {}
+    for tx in transactions:
+        if tx.kind != OutboxJob.Kind.TRANSFER:
+            continue
+        if tx.status != TrackedTransaction.Status.CONFIRMED or tx.failed_transfers:
+            failed[tx.tx_hash] = tx
+    if not failed:
+        return []
+
+    retried = []
+    for job in OutboxJob.objects.filter(
+        kind=OutboxJob.Kind.TRANSFER,
+        status=OutboxJob.Status.SUBMITTED,
+        tx_hash__in=list(failed),
+    ):
+        tx = failed[job.tx_hash]
+        if tx.status != TrackedTransaction.Status.CONFIRMED:
+            error = f"Transaction {tx.tx_hash} was {tx.status}."
+        elif job.batch_index in tx.failed_transfers:
+            error = f"Transfer {job.batch_index} of {tx.tx_hash} was rejected."
+        else:
+            continue
+        retried.append(record_result(job, error=error))
+    return retried
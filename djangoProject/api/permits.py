@@ -0,0 +1,70 @@
+import secrets
+import time
+
+from django.conf import settings
+from eth_abi import encode
+from eth_utils import keccak
+
+from .signing import signing_engine
+
+DOMAIN_TYPEHASH = keccak(
+    text="EIP712Domain(string name,string version,uint256 chainId,address verifyingContract)"
+)
+PERMIT_TYPEHASH = keccak(
+    text="Permit(address owner,address spender,uint256 value,uint256 nonce,uint256 deadline)"
+)
+DOMAIN_SEPARATOR = keccak(
+    encode(
+        ["bytes32", "bytes32", "bytes32", "uint256", "address"],
+        [
+            DOMAIN_TYPEHASH,
+            keccak(text="VirtualCurrency"),
+            keccak(text="1"),
+            settings.CHAIN_ID,
+            settings.CONTRACT_ADDRESS,
+        ],
+    )
+)
+
+
+def permit_digest(owner, spender, value, nonce, deadline):
+    struct_hash = keccak(
+        encode(
+            ["bytes32", "address", "address", "uint256", "uint256", "uint256"],
+            [PERMIT_TYPEHASH, owner, spender, value, nonce, deadline],
+        )
+    )
+    return keccak(b"\x19\x01" + DOMAIN_SEPARATOR + struct_hash)
+
+
+def sign_permit(private_key, owner, spender, value, nonce, deadline):
+    """Signs a VirtualCurrency permit off-chain and returns (v, r, s)."""
+    digest = permit_digest(owner, spender, value, nonce, deadline)
+    return signing_engine.sign_digests([(private_key, digest)])[0]
+
+
+def permit_transfers(transfers):
+    """
+    Builds PermitTransfer entries for batchPermitTransferFrom from
+    (private_key, from_address, spender, to_address, value) tuples, each
+    signed by its sender. Nonces are random because the contract accepts
+    permit nonces in any order.
+    """
+    deadline = int(time.time()) + settings.PERMIT_TTL
+    entries = []
+    digests = []
+    for private_key, from_address, spender, to_address, value in transfers:
+        nonce = secrets.randbits(256)
+        entries.append((from_address, to_address, value, nonce, deadline))
+        digests.append(
+            (private_key, permit_digest(from_address, spender, value, nonce, deadline))
+        )
+    signatures = signing_engine.sign_digests(digests)
+    return [entry + signature for entry, signature in zip(entries, signatures)]
+
+
+def permit_transfer(private_key, from_address, spender, to_address, value):
+    [entry] = permit_transfers(
+        [(private_key, from_address, spender, to_address, value)]
+    )
+    return entry
@@ -0,0 +1,273 @@
+import threading
+import time
+
+import requests
+from aiohttp import ClientTimeout
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from web3 import AsyncHTTPProvider, AsyncWeb3, HTTPProvider, Web3
+from web3._utils.request import async_make_post_request
+from web3.middleware import async_geth_poa_middleware, geth_poa_middleware
+
+from .instrumentation import async_rpc_timing_middleware, rpc_timing_middleware, timed
+from .nodes import NodePool
+
+# Per-call errors of a node that has not reached the requested block yet.
+MISSING_BLOCK_ERRORS = ("header not found", "unknown block", "block not found")
+
+_lock = threading.RLock()
+_session = None
+_node_pool = None
+_web3 = None
+_contract = None
+_async_web3 = None
+_async_contract = None
+
+
+class PooledHTTPProvider(HTTPProvider):
+    """
+    HTTPProvider that sends every request through one shared session.
+    The stock provider keeps a separate session per thread, so each
+    worker thread pays for its own TCP connection to the node. Requests
+    are routed over the node pool, and reads fail over to the next node.
+    """
+
+    def __init__(self, node_pool, session, timeout):
+        super().__init__(node_pool.primary.url)
+        self.node_pool = node_pool
+        self.session = session
+        self.timeout = timeout
+
+    def make_request(self, method, params):
+        request_data = self.encode_rpc_request(method, params)
+        response = post_to_pool(
+            self.node_pool,
+            [method],
+            lambda url: self.session.post(
+                url,
+                data=request_data,
+                headers={"Content-Type": "application/json"},
+                timeout=self.timeout,
+            ),
+        )
+        return self.decode_rpc_response(response.content)
+
+
+class PooledAsyncHTTPProvider(AsyncHTTPProvider):
+    """AsyncHTTPProvider that routes requests over the node pool."""
+
+    def __init__(self, node_pool, request_kwargs):
+        super().__init__(node_pool.primary.url, request_kwargs=request_kwargs)
+        self.node_pool = node_pool
+
+    async def make_request(self, method, params):
+        request_data = self.encode_rpc_request(method, params)
+        nodes = self.node_pool.route([method])
+        for attempt, node in enumerate(nodes, start=1):
+            started = time.perf_counter()
+            try:
+                raw_response = await async_make_post_request(
+                    node.url, request_data, **self.get_request_kwargs()
+                )
+            except Exception:
+                self.node_pool.observe(node, ok=False)
+                if attempt == len(nodes):
+                    raise
+                continue
+            self.node_pool.observe(node, time.perf_counter() - started)
+            return self.decode_rpc_response(raw_response)
+
+
+def post_to_pool(node_pool, methods, post, min_block=None, retry=None):
+    """
+    Calls post(url) on the nodes route() picks until one answers, feeding
+    the latency and any transport failure back into the pool. A response
+    for which retry(response) is true is also passed on to the next node,
+    unless it came from the last one.
+    """
+    nodes = node_pool.route(methods, min_block)
+    for attempt, node in enumerate(nodes, start=1):
+        started = time.perf_counter()
+        try:
+            response = post(node.url)
+            response.raise_for_status()
+        except requests.RequestException:
+            node_pool.observe(node, ok=False)
+            if attempt == len(nodes):
+                raise
+            continue
+        node_pool.observe(node, time.perf_counter() - started)
+        if retry is not None and attempt < len(nodes) and retry(response):
+            continue
+        return response
+
+
+def missing_block(response):
+    return any(
+        any(
+            text in str(reply.get("error", "")).lower() for text in MISSING_BLOCK_ERRORS
+        )
+        for reply in response.json()
+    )
+
+
+def get_session():
+    """
+    Returns the keep-alive session shared by all node traffic. Connection
+    failures are retried, but requests that reached the node are not, so a
+    transaction is never submitted twice by the transport.
+    """
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                retries = Retry(
+                    total=settings.WEB3_RETRIES,
+                    connect=settings.WEB3_RETRIES,
+                    read=0,
+                    status=0,
+                    backoff_factor=0.1,
+                    allowed_methods=None,
+                )
+                adapter = HTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=settings.WEB3_POOL_SIZE,
+                    max_retries=retries,
+                )
+                session = requests.Session()
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+
+def get_node_pool():
+    """
+    Returns the pool over WEB3_PROVIDERS and starts its background health
+    checks when there is more than one node.
+    """
+    global _node_pool
+    if _node_pool is None:
+        with _lock:
+            if _node_pool is None:
+                node_pool = NodePool(
+                    settings.WEB3_PROVIDERS,
+                    eject_after=settings.RPC_EJECT_AFTER,
+                    readmit_after=settings.RPC_READMIT_AFTER,
+                    max_lag=settings.RPC_MAX_LAG,
+                )
+                node_pool.start_health_checks(
+                    get_session(),
+                    settings.RPC_HEALTH_INTERVAL,
+                    settings.RPC_HEALTH_TIMEOUT,
+                )
+                _node_pool = node_pool
+    return _node_pool
+
+
+def get_web3():
+    """Returns the process-wide Web3 client."""
+    global _web3
+    if _web3 is None:
+        with _lock:
+            if _web3 is None:
+                web3 = Web3(
+                    PooledHTTPProvider(
+                        get_node_pool(), get_session(), settings.RPC_TIMEOUT
+                    )
+                )
+                web3.middleware_onion.inject(geth_poa_middleware, layer=0)
+                web3.middleware_onion.add(rpc_timing_middleware, "timing")
+                _web3 = web3
+    return _web3
+
+
+def get_contract():
+    """Returns the shared VirtualCurrency contract bound to get_web3()."""
+    global _contract
+    if _contract is None:
+        web3 = get_web3()
+        with _lock:
+            if _contract is None:
+                _contract = web3.eth.contract(
+                    address=settings.CONTRACT_ADDRESS, abi=settings.CONTRACT_ABI
+                )
+    return _contract
+
+
+def get_async_web3():
+    """
+    Returns the process-wide AsyncWeb3 client for ASGI views. Its aiohttp
+    provider keeps one connection pool per event loop.
+    """
+    global _async_web3
+    if _async_web3 is None:
+        with _lock:
+            if _async_web3 is None:
+                web3 = AsyncWeb3(
+                    PooledAsyncHTTPProvider(
+                        get_node_pool(),
+                        request_kwargs={
+                            "timeout": ClientTimeout(total=settings.RPC_TIMEOUT)
+                        },
+                    )
+                )
+                web3.middleware_onion.inject(async_geth_poa_middleware, layer=0)
+                web3.middleware_onion.add(async_rpc_timing_middleware, "timing")
+                _async_web3 = web3
+    return _async_web3
+
+
+def get_async_contract():
+    """Returns the shared VirtualCurrency contract bound to get_async_web3()."""
+    global _async_contract
+    if _async_contract is None:
+        web3 = get_async_web3()
+        with _lock:
+            if _async_contract is None:
+                _async_contract = web3.eth.contract(
+                    address=settings.CONTRACT_ADDRESS, abi=settings.CONTRACT_ABI
+                )
+    return _async_contract
+
+
+def rpc_batch_replies(calls, block_number=None):
+    """
+    Sends (method, params) pairs to the node as JSON-RPC batch requests,
+    RPC_BATCH_SIZE calls per round trip, and returns the raw reply objects
+    in order so callers can handle per-call errors. Calls pinned to
+    `block_number` are sent to a node that has it, failing over when a
+    node answers that it does not know the block yet.
+    """
+    replies = []
+    for start in range(0, len(calls), settings.RPC_BATCH_SIZE):
+        chunk = calls[start : start + settings.RPC_BATCH_SIZE]
+        payload = [
+            {"jsonrpc": "2.0", "id": request_id, "method": method, "params": params}
+            for request_id, (method, params) in enumerate(chunk)
+        ]
+        with timed("rpc", "batch"):
+            response = post_to_pool(
+                get_node_pool(),
+                [method for method, _ in chunk],
+                lambda url: get_session().post(
+                    url, json=payload, timeout=settings.RPC_TIMEOUT
+                ),
+                min_block=block_number,
+                retry=missing_block if block_number is not None else None,
+            )
+        by_id = {reply["id"]: reply for reply in response.json()}
+        for request_id in range(len(chunk)):
+            replies.append(by_id.get(request_id, {"error": "no reply"}))
+    return replies
+
+
+def rpc_batch(calls, block_number=None):
+    """Like rpc_batch_replies, but returns the results and raises on any error."""
+    results = []
+    for (method, params), reply in zip(calls, rpc_batch_replies(calls, block_number)):
+        if "error" in reply:
+            raise ValueError(f"RPC call {method} failed: {reply['error']}")
+        results.append(reply["result"])
+    return results
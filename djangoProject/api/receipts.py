@@ -0,0 +1,111 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from eth_utils import event_abi_to_log_topic
+
+from .models import TrackedTransaction
+from .provider import rpc_batch_replies
+
+PERMIT_TRANSFER_FAILED = (
+    "0x"
+    + event_abi_to_log_topic(
+        next(
+            abi
+            for abi in settings.CONTRACT_ABI
+            if abi["type"] == "event" and abi["name"] == "PermitTransferFailed"
+        )
+    ).hex()
+)
+
+
+def normalize_hash(tx_hash):
+    tx_hash = tx_hash if isinstance(tx_hash, str) else tx_hash.hex()
+    tx_hash = tx_hash.lower()
+    return tx_hash if tx_hash.startswith("0x") else "0x" + tx_hash
+
+
+def track(kind, *tx_hashes):
+    """Records submitted hashes as pending so the tracker can confirm them."""
+    TrackedTransaction.objects.bulk_create(
+        [
+            TrackedTransaction(tx_hash=normalize_hash(tx_hash), kind=kind)
+            for tx_hash in tx_hashes
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def failed_transfers(receipt):
+    """Returns the batch positions a receipt's PermitTransferFailed logs report."""
+    return [
+        int(log["data"], 16)
+        for log in receipt["logs"]
+        if log["topics"]
+        and log["topics"][0] == PERMIT_TRANSFER_FAILED
+        and log["address"].lower() == settings.CONTRACT_ADDRESS.lower()
+    ]
+
+
+def confirm_pending(batch_size=None):
+    """
+    Looks up receipts for every pending hash in JSON-RPC batches and stores
+    status, block, gas used and skipped permit transfers. Hashes the node
+    has neither mined nor kept in its pool for RECEIPT_DROP_AFTER seconds
+    are marked dropped. Returns the transactions whose status changed.
+    """
+    pending = list(
+        TrackedTransaction.objects.filter(
+            status=TrackedTransaction.Status.PENDING
+        ).order_by("id")[:batch_size]
+    )
+    if not pending:
+        return []
+
+    replies = rpc_batch_replies(
+        [("eth_getTransactionReceipt", [tx.tx_hash]) for tx in pending]
+    )
+    resolved = []
+    unmined = []
+    for tx, reply in zip(pending, replies):
+        receipt = reply.get("result")
+        if receipt is None:
+            unmined.append(tx)
+            continue
+        tx.status = (
+            TrackedTransaction.Status.CONFIRMED
+            if int(receipt["status"], 16) == 1
+            else TrackedTransaction.Status.REVERTED
+        )
+        tx.block_number = int(receipt["blockNumber"], 16)
+        tx.block_hash = receipt["blockHash"]
+        tx.gas_used = int(receipt["gasUsed"], 16)
+        tx.failed_transfers = failed_transfers(receipt)
+        resolved.append(tx)
+
+    cutoff = timezone.now() - timedelta(seconds=settings.RECEIPT_DROP_AFTER)
+    stale = [tx for tx in unmined if tx.submitted_at < cutoff]
+    if stale:
+        replies = rpc_batch_replies(
+            [("eth_getTransactionByHash", [tx.tx_hash]) for tx in stale]
+        )
+        for tx, reply in zip(stale, replies):
+            if "error" not in reply and reply.get("result") is None:
+                tx.status = TrackedTransaction.Status.DROPPED
+                resolved.append(tx)
+
+    now = timezone.now()
+    for tx in resolved:
+        tx.updated_at = now
+    TrackedTransaction.objects.bulk_update(
+        resolved,
+        [
+            "status",
+            "block_number",
+            "block_hash",
+            "gas_used",
+            "failed_transfers",
+            "updated_at",
+        ],
+    )
+    return resolved
@@ -0,0 +1,55 @@
+"""
+JSON output built on orjson, which serializes dicts, lists, strings and
+datetimes in Rust. Anything else goes through DRF's encoder, so responses
+look the same as with the stdlib renderer; values orjson cannot represent
+at all (integers wider than 64 bits) fall back to the stdlib encoder.
+"""
+
+import json
+
+import orjson
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z
+WEI_PER_ETHER = 10**18
+
+_encoder = JSONEncoder()
+
+
+def format_wei(value):
+    """
+    Formats an amount in wei as a plain decimal string in ether, without
+    the Decimal arithmetic of Web3.from_wei.
+    """
+    if value < 0:
+        return "-" + format_wei(-value)
+    ether, wei = divmod(value, WEI_PER_ETHER)
+    if not wei:
+        return str(ether)
+    return f"{ether}.{wei:018d}".rstrip("0")
+
+
+class ORJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        renderer_context = renderer_context or {}
+        if data is None or self.get_indent(accepted_media_type, renderer_context):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            return orjson.dumps(data, default=_encoder.default, option=OPTIONS)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+class ORJSONResponse(HttpResponse):
+    """A JsonResponse that serializes with orjson."""
+
+    def __init__(self, data, **kwargs):
+        kwargs.setdefault("content_type", "application/json")
+        try:
+            content = orjson.dumps(data, option=OPTIONS)
+        except orjson.JSONEncodeError:
+            content = json.dumps(data, cls=DjangoJSONEncoder)
+        super().__init__(content=content, **kwargs)
@@ -0,0 +1,108 @@
+"""
+Batch signing for bulk paths. eth_keys signs with coincurve (libsecp256k1)
+when it is installed and falls back to its pure-Python backend otherwise;
+either way large batches are split across a pool of processes so signing
+does not hold the GIL of the Django process.
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from eth_keys import keys
+from eth_utils import decode_hex
+
+from .instrumentation import timed
+from .transactions import get_account
+
+
+def backend_name():
+    return type(keys.backend).__name__
+
+
+def sign_transactions_chunk(items):
+    """Signs (transaction, private_key) pairs. Runs inside pool workers."""
+    return [
+        get_account(private_key).sign_transaction(transaction)
+        for transaction, private_key in items
+    ]
+
+
+def sign_digests_chunk(items):
+    """Signs (private_key, digest) pairs into (v, r, s). Runs inside pool workers."""
+    signatures = []
+    for private_key, digest in items:
+        signature = keys.PrivateKey(decode_hex(private_key)).sign_msg_hash(digest)
+        signatures.append(
+            (
+                signature.v + 27,
+                signature.r.to_bytes(32, "big"),
+                signature.s.to_bytes(32, "big"),
+            )
+        )
+    return signatures
+
+
+class SigningEngine:
+    """
+    Signs batches inline when they are smaller than `min_batch`, where
+    pickling to another process would cost more than it saves, and across
+    `workers` processes otherwise. A broken pool is replaced on the next
+    batch and the current one is signed inline.
+    """
+
+    def __init__(self, workers, min_batch):
+        self.workers = workers or os.cpu_count() or 1
+        self.min_batch = min_batch
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                # Forking would copy the server's threads, sockets and DB
+                # connections into the workers; spawned ones import only this
+                # module.
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._pool
+
+    def run(self, fn, items, label):
+        if len(items) < self.min_batch or self.workers == 1:
+            with timed("sign", label):
+                return fn(items)
+        chunk_size = -(-len(items) // self.workers)
+        chunks = [
+            items[start : start + chunk_size]
+            for start in range(0, len(items), chunk_size)
+        ]
+        with timed("sign", f"{label}_pool"):
+            try:
+                results = list(self.get_pool().map(fn, chunks))
+            except BrokenProcessPool:
+                with self._lock:
+                    self._pool = None
+                return fn(items)
+        return [result for chunk in results for result in chunk]
+
+    def sign_transactions(self, items):
+        """Returns a SignedTransaction per (transaction, private_key) pair."""
+        return self.run(sign_transactions_chunk, list(items), "transaction")
+
+    def sign_digests(self, items):
+        """Returns (v, r, s) per (private_key, digest) pair."""
+        return self.run(sign_digests_chunk, list(items), "permit")
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+
+signing_engine = SigningEngine(settings.SIGNING_WORKERS, settings.SIGNING_MIN_BATCH)
@@ -0,0 +1,97 @@
+"""
+Request coalescing for node reads. While a read is in flight, identical
+reads (same name and key, e.g. the same addresses at the same block) wait
+for it and share its result instead of sending their own RPC calls.
+Results are shared objects, so callers must not mutate them. Coalescing
+is per process: across threads for WSGI workers and across tasks of one
+event loop under ASGI.
+"""
+
+import asyncio
+import threading
+
+
+class Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self.calls = {}
+        self.executed = {}
+        self.shared = {}
+        self._lock = threading.Lock()
+
+    def count(self, counters, name):
+        counters[name] = counters.get(name, 0) + 1
+
+    def do(self, name, key, fn, *args):
+        key = (name, key)
+        with self._lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = Call()
+                self.count(self.executed, name)
+            else:
+                self.count(self.shared, name)
+
+        if leader:
+            try:
+                call.result = fn(*args)
+            except Exception as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self.calls[key]
+                call.done.set()
+        else:
+            call.done.wait()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def stats(self):
+        with self._lock:
+            return {
+                "reads": {
+                    name: {
+                        "executed": self.executed.get(name, 0),
+                        "shared": self.shared.get(name, 0),
+                    }
+                    for name in sorted(set(self.executed) | set(self.shared))
+                },
+                "in_flight": len(self.calls),
+            }
+
+
+class AsyncSingleFlight(SingleFlight):
+    """
+    The same for coroutines. The shared read runs as its own task, so a
+    caller that is cancelled (e.g. its client went away) does not cancel
+    it for the others.
+    """
+
+    async def do(self, name, key, fn, *args):
+        key = (name, asyncio.get_running_loop(), key)
+        with self._lock:
+            task = self.calls.get(key)
+            if task is None:
+                task = self.calls[key] = asyncio.ensure_future(fn(*args))
+                task.add_done_callback(lambda _: self.forget(key))
+                self.count(self.executed, name)
+            else:
+                self.count(self.shared, name)
+        return await asyncio.shield(task)
+
+    def forget(self, key):
+        with self._lock:
+            self.calls.pop(key, None)
+
+
+single_flight = SingleFlight()
+async_single_flight = AsyncSingleFlight()
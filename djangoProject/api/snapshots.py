@@ -0,0 +1,151 @@
+"""
+Restores the chain state saved by project/scripts/snapshot.py, so tests
+and benchmarks can reset to a deployed contract with funded users instead
+of redeploying.
+"""
+
+import json
+import os
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from rest_framework.authtoken.models import Token
+
+from .cache import balance_cache
+from .models import (
+    CustomUser,
+    IndexerCheckpoint,
+    LedgerAccount,
+    LedgerEntry,
+    LedgerSettlement,
+    LedgerTransfer,
+    NonceCounter,
+    OutboxJob,
+    ReleasedNonce,
+    TokenBalance,
+    TokenEvent,
+    TrackedTransaction,
+)
+from .transactions import get_account
+from .utils import CONTRACT_ADDRESS, web3
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def load_manifest(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(path, manifest):
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(temporary_path, path)
+
+
+def revert_chain(path):
+    """
+    Reverts the node to the manifest's evm_snapshot and takes a fresh one,
+    since ganache drops a snapshot once it has been reverted to. The new
+    id is written back so the next reset works too.
+    """
+    manifest = load_manifest(path)
+    snapshot_id = manifest.get("snapshot_id")
+    if snapshot_id is None:
+        raise SnapshotError(f"{path} has no snapshot_id.")
+    if not web3.provider.make_request("evm_revert", [snapshot_id]).get("result"):
+        raise SnapshotError(
+            f"The node has no snapshot {snapshot_id}. Restart it from the "
+            f"saved database ({manifest.get('ganache_db')}) or run "
+            "scripts/snapshot.py again."
+        )
+    manifest["snapshot_id"] = web3.provider.make_request("evm_snapshot", [])["result"]
+    save_manifest(path, manifest)
+    return manifest
+
+
+def reset_offchain_state():
+    """
+    Drops what the database remembers about chain state the snapshot no
+    longer has: nonce counters (the next allocation asks the node again),
+    the event index, tracked and unfinished outbox transactions, and the
+    ledger, whose accounts reopen at their on-chain balance. Call it in the
+    same transaction as the revert. Cached balances are invalidated once
+    it commits.
+    """
+    NonceCounter.objects.all().delete()
+    ReleasedNonce.objects.all().delete()
+    IndexerCheckpoint.objects.all().delete()
+    TokenBalance.objects.all().delete()
+    TokenEvent.objects.all().delete()
+    TrackedTransaction.objects.all().delete()
+    OutboxJob.objects.filter(
+        status__in=[
+            OutboxJob.Status.PENDING,
+            OutboxJob.Status.PROCESSING,
+            OutboxJob.Status.SUBMITTED,
+        ]
+    ).delete()
+    LedgerEntry.objects.all().delete()
+    LedgerTransfer.objects.all().delete()
+    LedgerSettlement.objects.all().delete()
+    LedgerAccount.objects.all().delete()
+    addresses = list(CustomUser.objects.values_list("wallet_address", flat=True))
+    addresses.append(get_account(settings.CENTRAL_ACCOUNT_PRIVATE_KEY).address)
+    transaction.on_commit(lambda: balance_cache.invalidate(*addresses))
+
+
+def check_contract(manifest):
+    if manifest["contract_address"] != CONTRACT_ADDRESS:
+        raise SnapshotError(
+            f"The manifest's contract {manifest['contract_address']} is not "
+            f"CONTRACT_ADDRESS ({CONTRACT_ADDRESS})."
+        )
+    if not web3.eth.get_code(CONTRACT_ADDRESS):
+        raise SnapshotError(f"No contract is deployed at {CONTRACT_ADDRESS}.")
+
+
+def seed_users(users):
+    """
+    Creates the manifest's funded users with a token each, skipping
+    usernames that already exist. Users sharing a password share its hash,
+    which keeps seeding thousands of test users fast.
+    """
+    existing = set(
+        CustomUser.objects.filter(
+            username__in=[user["username"] for user in users]
+        ).values_list("username", flat=True)
+    )
+    hashes = {}
+    new_users = []
+    for user in users:
+        if user["username"] in existing:
+            continue
+        if user["password"] not in hashes:
+            hashes[user["password"]] = make_password(user["password"])
+        new_users.append(
+            CustomUser(
+                username=user["username"],
+                wallet_address=user["wallet_address"],
+                private_key=user["private_key"],
+                password=hashes[user["password"]],
+            )
+        )
+    if not new_users:
+        return 0
+    with transaction.atomic():
+        created = CustomUser.objects.bulk_create(new_users)
+        if any(user.pk is None for user in created):
+            created = list(
+                CustomUser.objects.filter(
+                    username__in=[user.username for user in new_users]
+                )
+            )
+        Token.objects.bulk_create(
+            [Token(key=Token.generate_key(), user=user) for user in created]
+        )
+    return len(created)
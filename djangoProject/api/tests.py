@@ -1,3 +1,466 @@
-from django.test import TestCase
+import asyncio
+import threading
+import time
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .analytics import distribution, from_limbs, to_limbs
+from .cache import BalanceCache
+from .ledger import (
+    InsufficientFunds,
+    book_transfer,
+    confirm_settlements,
+    net_legs,
+    settle,
+)
+from .models import (
+    CustomUser,
+    LedgerAccount,
+    LedgerSettlement,
+    LedgerTransfer,
+    OutboxJob,
+    TrackedTransaction,
+)
+from .nonces import NonceManager
+from .outbox import claim_batch, enqueue, process_batch, retry_failed_transfers
+from .renderers import format_wei
+from .singleflight import AsyncSingleFlight, SingleFlight
+
+ADDRESS = "0x" + "11" * 20
+
+
+class FakeEth:
+    """Stands in for web3.eth; nothing is ever mined, so pending stays put."""
+
+    def __init__(self, pending=0):
+        self.pending = pending
+
+    def get_transaction_count(self, address, block_identifier):
+        return self.pending
+
+
+class NonceManagerTests(TransactionTestCase):
+    def setUp(self):
+        self.eth = FakeEth()
+        self.nonces = NonceManager(SimpleNamespace(eth=self.eth))
+
+    def test_resync_keeps_nonces_allocated_after_the_failed_one(self):
+        failed = self.nonces.allocate(ADDRESS)
+        in_flight = self.nonces.allocate(ADDRESS)
+        self.nonces.resync(ADDRESS, [failed])
+        self.assertEqual(self.nonces.allocate(ADDRESS), failed)
+        self.assertEqual(self.nonces.allocate(ADDRESS), in_flight + 1)
+
+    def test_released_nonce_is_reused_by_another_process(self):
+        other = NonceManager(SimpleNamespace(eth=self.eth))
+        failed = self.nonces.allocate(ADDRESS)
+        other.allocate(ADDRESS)
+        self.nonces.resync(ADDRESS, [failed])
+        self.assertEqual(other.allocate(ADDRESS), failed)
+        self.assertEqual(self.nonces.released(ADDRESS), [])
+
+    def test_resync_drops_released_nonces_the_node_has_seen(self):
+        failed = self.nonces.allocate(ADDRESS)
+        self.nonces.allocate(ADDRESS)
+        self.nonces.resync(ADDRESS, [failed])
+        self.eth.pending = 2
+        self.nonces.resync(ADDRESS, [])
+        self.assertEqual(self.nonces.released(ADDRESS), [])
+        self.assertEqual(self.nonces.allocate(ADDRESS), 2)
+
+    def test_resync_rewinds_over_the_last_allocation(self):
+        self.nonces.allocate(ADDRESS)
+        failed = self.nonces.allocate(ADDRESS, 3)
+        self.nonces.resync(ADDRESS, [failed + 1, failed + 2])
+        self.assertEqual(self.nonces.allocate(ADDRESS), failed + 1)
+
+    def test_resync_moves_forward_to_pending(self):
+        self.nonces.allocate(ADDRESS)
+        self.eth.pending = 5
+        self.nonces.resync(ADDRESS, [])
+        self.assertEqual(self.nonces.allocate(ADDRESS), 5)
+
+    def test_concurrent_allocate_and_resync(self):
+        sent = []
+        lock = threading.Lock()
+
+        def worker(index):
+            try:
+                for attempt in range(20):
+                    nonce = self.nonces.allocate(ADDRESS)
+                    if (index + attempt) % 3 == 0:
+                        self.nonces.resync(ADDRESS, [nonce])
+                    else:
+                        with lock:
+                            sent.append(nonce)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(sent), len(set(sent)))
+        # Every nonce below the counter was either sent or is waiting to be
+        # handed out again, so no gap is left behind.
+        next_nonce = self.nonces.resync(ADDRESS, [])
+        released = self.nonces.released(ADDRESS)
+        self.assertEqual(sorted(sent + released), list(range(next_nonce)))
+
+
+class DistributionTests(SimpleTestCase):
+    def test_balances_above_2_128_are_exact(self):
+        whale = 2**130 + 123456789
+        balances = [3, 0, whale, 10**18, 2**256 - 1]
+        addresses = ["small", "empty", "whale", "one", "max"]
+        report = distribution(addresses, balances, top=3)
+        self.assertEqual(report["holders"], 4)
+        self.assertEqual(report["sum_of_balances"], format_wei(sum(balances)))
+        self.assertEqual(
+            report["top_holders"],
+            [
+                {"address": "max", "balance": format_wei(2**256 - 1)},
+                {"address": "whale", "balance": format_wei(whale)},
+                {"address": "one", "balance": "1"},
+            ],
+        )
+
+    def test_limbs_round_trip(self):
+        balances = [0, 1, 10**42, 2**256 - 1]
+        limbs = to_limbs(balances)
+        self.assertEqual(
+            [from_limbs(limbs[:, i]) for i in range(len(balances))], balances
+        )
+
+
+class OutboxTests(TestCase):
+    def test_claim_batch_hands_each_job_out_once(self):
+        jobs = [enqueue(OutboxJob.Kind.MINT, ADDRESS, amount) for amount in (1, 2, 3)]
+        first, second = claim_batch(2), claim_batch(2)
+        self.assertEqual([job.pk for job in first], [job.pk for job in jobs[:2]])
+        self.assertEqual([job.pk for job in second], [jobs[2].pk])
+        self.assertEqual(claim_batch(2), [])
+        self.assertNotEqual(first[0].claimed_by, second[0].claimed_by)
+        self.assertTrue(
+            all(job.status == OutboxJob.Status.PROCESSING for job in first + second)
+        )
+
+    def test_stale_claim_is_released(self):
+        job = enqueue(OutboxJob.Kind.MINT, ADDRESS, 1)
+        [claimed] = claim_batch(1)
+        self.assertEqual(claim_batch(1), [])
+        OutboxJob.objects.filter(pk=job.pk).update(
+            updated_at=timezone.now()
+            - timedelta(seconds=settings.OUTBOX_CLAIM_TIMEOUT + 1)
+        )
+        [reclaimed] = claim_batch(1)
+        self.assertEqual(reclaimed.pk, job.pk)
+        self.assertNotEqual(reclaimed.claimed_by, claimed.claimed_by)
+
+    def test_registration_queues_the_funding_transfer(self):
+        response = APIClient().post(
+            reverse("register"),
+            {"username": "alice", "password": "secret"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 202)
+        user = CustomUser.objects.get(username="alice")
+        job = OutboxJob.objects.get(pk=response.json()["job_id"])
+        self.assertEqual(job.kind, OutboxJob.Kind.FUND)
+        self.assertEqual(job.status, OutboxJob.Status.PENDING)
+        self.assertEqual(job.recipient_address, user.wallet_address)
+        self.assertEqual(job.amount, response.json()["initial_vc_balance"] * 10**18)
+
+    @override_settings(OUTBOX_MAX_PENDING=0)
+    def test_full_outbox_rolls_back_the_registration(self):
+        response = APIClient().post(
+            reverse("register"),
+            {"username": "alice", "password": "secret"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "5")
+        self.assertFalse(CustomUser.objects.filter(username="alice").exists())
+        self.assertFalse(OutboxJob.objects.exists())
+
+
+class BalanceCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = BalanceCache(max_entries=10, block_ttl=1)
+        self.cache.observe_block(7)
+
+    def test_cached_balance_is_returned_for_the_same_block(self):
+        _, generations = self.cache.get_many([ADDRESS], 7)
+        self.cache.set_many({ADDRESS: (1, 2)}, 7, generations)
+        self.assertEqual(self.cache.get_many([ADDRESS], 7)[0], {ADDRESS: (1, 2)})
+        self.cache.observe_block(8)
+        self.assertEqual(self.cache.get_many([ADDRESS], 7)[0], {})
+
+    def test_invalidate_drops_the_cached_balance(self):
+        _, generations = self.cache.get_many([ADDRESS], 7)
+        self.cache.set_many({ADDRESS: (1, 2)}, 7, generations)
+        self.cache.invalidate(ADDRESS)
+        self.assertEqual(self.cache.get_many([ADDRESS], 7)[0], {})
+        self.assertIsNone(self.cache.fresh_block_number())
+
+    def test_read_from_before_an_invalidation_is_not_cached(self):
+        _, generations = self.cache.get_many([ADDRESS], 7)
+        self.cache.invalidate(ADDRESS)
+        self.cache.set_many({ADDRESS: (1, 2)}, 7, generations)
+        balances, generations = self.cache.get_many([ADDRESS], 7)
+        self.assertEqual(balances, {})
+        self.cache.set_many({ADDRESS: (3, 4)}, 7, generations)
+        self.assertEqual(self.cache.get_many([ADDRESS], 7)[0], {ADDRESS: (3, 4)})
+
+    @override_settings(
+        CACHES={
+            "balances": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+        }
+    )
+    def test_shared_backend_skips_reads_from_before_an_invalidation(self):
+        cache = BalanceCache(max_entries=10, block_ttl=1, alias="balances")
+        other_worker = BalanceCache(max_entries=10, block_ttl=1, alias="balances")
+        _, generations = cache.get_many([ADDRESS], 7)
+        other_worker.invalidate(ADDRESS)
+        cache.set_many({ADDRESS: (1, 2)}, 7, generations)
+        self.assertEqual(other_worker.get_many([ADDRESS], 7)[0], {})
+        _, generations = other_worker.get_many([ADDRESS], 7)
+        other_worker.set_many({ADDRESS: (3, 4)}, 7, generations)
+        self.assertEqual(cache.get_many([ADDRESS], 7)[0], {ADDRESS: (3, 4)})
+
+
+class BatchedTransferTests(TestCase):
+    TX_HASH = "0x" + "ab" * 32
+
+    def setUp(self):
+        self.sender = CustomUser.objects.create_user(username="alice", password="pw")
+        for amount in (1, 2, 3):
+            enqueue(OutboxJob.Kind.TRANSFER, ADDRESS, amount, sender=self.sender)
+
+    def submit(self):
+        with mock.patch(
+            "api.outbox.perform_transfers", return_value=self.TX_HASH
+        ) as perform_transfers:
+            jobs = process_batch(claim_batch(10))
+        return perform_transfers, jobs
+
+    def test_transfers_share_one_transaction(self):
+        perform_transfers, jobs = self.submit()
+        perform_transfers.assert_called_once()
+        _, transfers = perform_transfers.call_args.args
+        self.assertEqual([amount for _, _, amount, _ in transfers], [1, 2, 3])
+        self.assertEqual([job.batch_index for job in jobs], [0, 1, 2])
+        self.assertEqual({job.tx_hash for job in jobs}, {self.TX_HASH})
+        self.assertEqual({job.status for job in jobs}, {OutboxJob.Status.SUBMITTED})
+
+    def test_transfers_the_contract_skipped_are_retried(self):
+        self.submit()
+        tx = TrackedTransaction.objects.create(
+            tx_hash=self.TX_HASH,
+            kind=OutboxJob.Kind.TRANSFER,
+            status=TrackedTransaction.Status.CONFIRMED,
+            failed_transfers=[1],
+        )
+        [retried] = retry_failed_transfers([tx])
+        self.assertEqual(retried.batch_index, 1)
+        self.assertEqual(retried.status, OutboxJob.Status.PENDING)
+        self.assertEqual(retried.attempts, 2)
+        self.assertEqual(
+            OutboxJob.objects.filter(status=OutboxJob.Status.SUBMITTED).count(), 2
+        )
+
+    def test_every_transfer_of_a_reverted_transaction_is_retried(self):
+        self.submit()
+        tx = TrackedTransaction.objects.create(
+            tx_hash=self.TX_HASH,
+            kind=OutboxJob.Kind.TRANSFER,
+            status=TrackedTransaction.Status.REVERTED,
+        )
+        self.assertEqual(len(retry_failed_transfers([tx])), 3)
+        self.assertFalse(
+            OutboxJob.objects.filter(status=OutboxJob.Status.SUBMITTED).exists()
+        )
+
+    def test_confirmed_transaction_without_failures_is_left_alone(self):
+        self.submit()
+        tx = TrackedTransaction.objects.create(
+            tx_hash=self.TX_HASH,
+            kind=OutboxJob.Kind.TRANSFER,
+            status=TrackedTransaction.Status.CONFIRMED,
+        )
+        self.assertEqual(retry_failed_transfers([tx]), [])
+
+
+class LedgerTests(TestCase):
+    TX_HASH = "0x" + "cd" * 32
+
+    def setUp(self):
+        self.users = {}
+        for name in ("alice", "bob", "carol"):
+            user = CustomUser.objects.create_user(username=name, password="pw")
+            LedgerAccount.objects.create(user=user, chain_balance=10)
+            self.users[name] = user
+        for sender, recipient, amount in [
+            ("alice", "bob", 2),
+            ("bob", "carol", 6),
+            ("alice", "carol", 4),
+        ]:
+            book_transfer(self.users[sender], self.users[recipient], amount)
+
+    def balances(self):
+        return {
+            account.user.username: (
+                account.chain_balance,
+                account.pending_credit,
+                account.pending_debit,
+            )
+            for account in LedgerAccount.objects.select_related("user")
+        }
+
+    def settle(self, **kwargs):
+        kwargs.setdefault("return_value", self.TX_HASH)
+        with mock.patch("api.ledger.perform_transfers", **kwargs) as perform:
+            return settle(), perform
+
+    def test_booking_moves_only_pending_amounts(self):
+        self.assertEqual(
+            self.balances(),
+            {"alice": (10, 0, 6), "bob": (10, 2, 6), "carol": (10, 10, 0)},
+        )
+        with self.assertRaises(InsufficientFunds):
+            book_transfer(self.users["alice"], self.users["bob"], 5)
+
+    def test_net_legs_pair_debtors_with_creditors(self):
+        accounts = [
+            SimpleNamespace(name=name, pending_credit=credit, pending_debit=debit)
+            for name, credit, debit in [("a", 0, 6), ("b", 2, 6), ("c", 10, 0)]
+        ]
+        legs = [
+            (debtor.name, creditor.name, amount)
+            for debtor, creditor, amount in net_legs(accounts)
+        ]
+        self.assertEqual(legs, [("a", "c", 6), ("b", "c", 4)])
+
+    def test_settle_submits_the_net_legs(self):
+        settlement, perform = self.settle()
+        perform.assert_called_once()
+        _, transfers = perform.call_args.args
+        self.assertEqual([amount for _, _, amount, _ in transfers], [6, 4])
+        self.assertEqual(settlement.status, LedgerSettlement.Status.SUBMITTED)
+        self.assertEqual(settlement.transfers, 3)
+        self.assertEqual(settlement.tx_hashes, [self.TX_HASH])
+        self.assertEqual(
+            self.balances(),
+            {"alice": (4, 0, 0), "bob": (6, 0, 0), "carol": (20, 0, 0)},
+        )
+        self.assertFalse(LedgerTransfer.objects.filter(settlement=None).exists())
+        self.assertFalse(LedgerAccount.objects.exclude(settlement=None).exists())
+        self.assertEqual(self.settle()[0], None)
+        self.assertEqual(LedgerSettlement.objects.count(), 1)
+
+    def test_failed_submission_puts_the_legs_back(self):
+        settlement, _ = self.settle(side_effect=ConnectionError("node down"))
+        self.assertEqual(settlement.status, LedgerSettlement.Status.FAILED)
+        self.assertIn("node down", settlement.error)
+        # The net legs are pending again, so the balances are unchanged.
+        self.assertEqual(
+            self.balances(),
+            {"alice": (10, 0, 6), "bob": (10, 0, 4), "carol": (10, 10, 0)},
+        )
+
+    def test_confirm_restores_legs_the_contract_skipped(self):
+        self.settle()
+        self.assertEqual(confirm_settlements(), 0)
+        TrackedTransaction.objects.create(
+            tx_hash=self.TX_HASH,
+            kind=OutboxJob.Kind.TRANSFER,
+            status=TrackedTransaction.Status.CONFIRMED,
+            failed_transfers=[1],
+        )
+        self.assertEqual(confirm_settlements(), 1)
+        self.assertEqual(confirm_settlements(), 0)
+        self.assertEqual(
+            LedgerSettlement.objects.get().status, LedgerSettlement.Status.CONFIRMED
+        )
+        self.assertEqual(
+            self.balances(),
+            {"alice": (4, 0, 0), "bob": (10, 0, 4), "carol": (16, 4, 0)},
+        )
+
+
+class SingleFlightTests(SimpleTestCase):
+    def test_concurrent_identical_reads_share_one_call(self):
+        flight = SingleFlight()
+        started, release = threading.Event(), threading.Event()
+        calls, results = [], []
+
+        def read(address):
+            calls.append(address)
+            started.set()
+            release.wait(5)
+            return {address: 1}
+
+        def caller():
+            results.append(flight.do("balances", (ADDRESS,), read, ADDRESS))
+
+        leader = threading.Thread(target=caller)
+        leader.start()
+        started.wait(5)
+        followers = [threading.Thread(target=caller) for _ in range(4)]
+        for thread in followers:
+            thread.start()
+        deadline = time.monotonic() + 5
+        while flight.stats()["reads"]["balances"]["shared"] < 4:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.001)
+        release.set()
+        for thread in [leader] + followers:
+            thread.join()
+
+        self.assertEqual(calls, [ADDRESS])
+        self.assertEqual(results, [{ADDRESS: 1}] * 5)
+        self.assertEqual(
+            flight.stats(),
+            {"reads": {"balances": {"executed": 1, "shared": 4}}, "in_flight": 0},
+        )
+
+    def test_errors_reach_every_caller_and_are_not_kept(self):
+        flight = SingleFlight()
+
+        def fail():
+            raise ConnectionError("node down")
+
+        with self.assertRaises(ConnectionError):
+            flight.do("balances", (ADDRESS,), fail)
+        self.assertEqual(flight.do("balances", (ADDRESS,), lambda: 2), 2)
+
+    def test_async_reads_survive_a_cancelled_caller(self):
+        flight = AsyncSingleFlight()
+        calls = []
+
+        async def read():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return 3
+
+        async def main():
+            first = asyncio.create_task(flight.do("balances", (ADDRESS,), read))
+            second = asyncio.create_task(flight.do("balances", (ADDRESS,), read))
+            await asyncio.sleep(0)
+            first.cancel()
+            return await second
+
+        self.assertEqual(asyncio.run(main()), 3)
+        self.assertEqual(calls, [1])
+        self.assertEqual(flight.stats()["in_flight"], 0)
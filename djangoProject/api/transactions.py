@@ -0,0 +1,74 @@
+import threading
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from eth_abi import encode
+from eth_account import Account
+from eth_utils import function_abi_to_4byte_selector
+from eth_utils.abi import collapse_if_tuple
+from web3 import Web3
+
+FUNCTIONS = {
+    item["name"]: (
+        function_abi_to_4byte_selector(item),
+        [collapse_if_tuple(param) for param in item["inputs"]],
+    )
+    for item in settings.CONTRACT_ABI
+    if item["type"] == "function"
+}
+
+
+def encode_call(fn_name, args):
+    """ABI-encodes a VirtualCurrency call from the selectors computed at import."""
+    selector, types = FUNCTIONS[fn_name]
+    return Web3.to_hex(selector + encode(types, args))
+
+
+@lru_cache(maxsize=settings.ACCOUNT_CACHE_SIZE)
+def get_account(private_key):
+    """Returns the LocalAccount for a key, deriving each address only once."""
+    return Account.from_key(private_key)
+
+
+class GasPriceOracle:
+    """Remembers the node's gas price for `ttl` seconds."""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.value = None
+        self.fetched_at = 0.0
+        self._lock = threading.Lock()
+
+    def current(self):
+        with self._lock:
+            if self.value is not None and time.monotonic() - self.fetched_at < self.ttl:
+                return self.value
+        return None
+
+    def update(self, value):
+        with self._lock:
+            self.value = value
+            self.fetched_at = time.monotonic()
+        return value
+
+
+gas_price_oracle = GasPriceOracle(settings.GAS_PRICE_TTL)
+
+
+def build_transaction(from_address, fn_name, args, nonce, gas, gas_price=0):
+    """
+    Builds a contract call transaction locally. Unlike build_transaction on
+    a contract function, nothing here needs the node once the nonce and gas
+    price are known.
+    """
+    return {
+        "from": from_address,
+        "to": settings.CONTRACT_ADDRESS,
+        "value": 0,
+        "data": encode_call(fn_name, args),
+        "gas": gas,
+        "gasPrice": gas_price,
+        "nonce": nonce,
+        "chainId": settings.CHAIN_ID,
+    }
@@ -1,12 +1,32 @@
 from django.urls import path
 
-from . import views
+from . import async_views, views
+from .instrumentation import metrics_view
 
 urlpatterns = [
     path("login/", views.custom_login_view, name="login"),
     path("register/", views.register_view, name="register"),
     path("balance/", views.balance_view, name="balance"),
+    path(
+        "balance/cache-stats/",
+        views.balance_cache_stats_view,
+        name="balance_cache_stats",
+    ),
+    path(
+        "balance/single-flight-stats/",
+        views.single_flight_stats_view,
+        name="single_flight_stats",
+    ),
     path("accounts/", views.list_accounts_view, name="list_accounts"),
+    path("analytics/holders/", views.holder_analytics_view, name="holder_analytics"),
     path("mint-tokens/", views.mint_tokens_view, name="mint_tokens"),
+    path("mint-tokens/bulk/", views.bulk_mint_tokens_view, name="bulk_mint_tokens"),
     path("transfer/", views.transfer_view, name="transfer"),
+    path("jobs/<int:job_id>/", views.job_status_view, name="job_status"),
+    path("tx/<str:tx_hash>/", views.transaction_status_view, name="tx_status"),
+    path("metrics", metrics_view, name="metrics"),
+    path("async/balance/", async_views.balance_view, name="async_balance"),
+    path("async/accounts/", async_views.list_accounts_view, name="async_list_accounts"),
+    path("async/transfer/", async_views.transfer_view, name="async_transfer"),
+    path("async/mint-tokens/", async_views.mint_tokens_view, name="async_mint_tokens"),
 ]
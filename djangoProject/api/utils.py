@@ -2,16 +2,23 @@ import secrets
 
 from django.conf import settings
 from web3 import Web3
-from web3.middleware import geth_poa_middleware
 
-from .models import CustomUser
+from .cache import balance_cache
+from .models import CustomUser, OutboxJob
+from .nonces import NonceManager
+from .permits import permit_transfers
+from .provider import get_contract, get_web3, rpc_batch_replies
+from .receipts import track
+from .signing import signing_engine
+from .transactions import build_transaction, gas_price_oracle, get_account
 
-web3 = Web3(Web3.HTTPProvider(settings.WEB3_PROVIDER))
-web3.middleware_onion.inject(geth_poa_middleware, layer=0)
+web3 = get_web3()
 
 CONTRACT_ABI = settings.CONTRACT_ABI
 CONTRACT_ADDRESS = settings.CONTRACT_ADDRESS
-CONTRACT = web3.eth.contract(address=CONTRACT_ADDRESS, abi=CONTRACT_ABI)
+CONTRACT = get_contract()
+
+nonce_manager = NonceManager(web3)
 
 
 def create_user_account(username, password):
@@ -25,70 +32,235 @@ def create_user_account(username, password):
     return user
 
 
-def perform_transfer(
-    central_private_key, from_address, to_address, amount, sender_private_key
-):
+def send_signed_transaction(transaction, private_key):
+    """
+    Signs and submits a transaction whose nonce came from nonce_manager.
+    If the node rejects it, the sender's counter is resynced so the unused
+    nonce does not leave a gap in front of later transactions.
+    """
     try:
-        central_account = web3.eth.account.from_key(central_private_key)
-        central_address = central_account.address
-        sender_nonce = web3.eth.get_transaction_count(from_address)
-        approve_tx = CONTRACT.functions.approve(
-            central_address, amount
-        ).build_transaction(
-            {
-                "from": from_address,
-                "gas": 200000,
-                "gasPrice": web3.to_wei("0", "gwei"),
-                "nonce": sender_nonce,
-                "chainId": 1337,
-            }
+        [signed_transaction] = signing_engine.sign_transactions(
+            [(transaction, private_key)]
         )
-        signed_approve_tx = web3.eth.account.sign_transaction(
-            approve_tx, sender_private_key
+        return web3.eth.send_raw_transaction(signed_transaction.rawTransaction)
+    except Exception:
+        nonce_manager.resync(transaction["from"], [transaction["nonce"]])
+        raise
+
+
+def build_with_nonce(address, build):
+    """
+    Allocates a nonce for `address` and returns build(nonce). If building
+    fails the nonce is given back before the error propagates.
+    """
+    nonce = nonce_manager.allocate(address)
+    try:
+        return build(nonce)
+    except Exception:
+        nonce_manager.resync(address, [nonce])
+        raise
+
+
+def current_gas_price():
+    gas_price = gas_price_oracle.current()
+    if gas_price is None:
+        gas_price = gas_price_oracle.update(web3.eth.gas_price)
+    return gas_price
+
+
+def fund_account(private_key, to_address, amount):
+    try:
+        central_account = get_account(private_key)
+        transaction = build_with_nonce(
+            central_account.address,
+            lambda nonce: build_transaction(
+                central_account.address,
+                "transfer",
+                [to_address, amount],
+                nonce=nonce,
+                gas=200000,
+            ),
         )
-        web3.eth.send_raw_transaction(signed_approve_tx.rawTransaction)
-        nonce = web3.eth.get_transaction_count(central_address)
-        transaction = CONTRACT.functions.transferFrom(
-            from_address, to_address, amount
-        ).build_transaction(
-            {
-                "from": central_address,
-                "gas": 200000,
-                "gasPrice": web3.to_wei("0", "gwei"),
-                "nonce": nonce,
-                "chainId": 1337,
-            }
+        tx_hash = send_signed_transaction(transaction, private_key)
+        track(OutboxJob.Kind.FUND, tx_hash)
+        balance_cache.invalidate(central_account.address, to_address)
+        return tx_hash.hex()
+    except Exception as e:
+        print(f"Funding failed: {str(e)}")
+        raise
+
+
+def build_permit_transfers_transaction(central_address, nonce, permit_transfers):
+    return build_transaction(
+        central_address,
+        "batchPermitTransferFrom",
+        [permit_transfers],
+        nonce=nonce,
+        gas=100000 + 80000 * len(permit_transfers),
+    )
+
+
+def perform_transfers(central_private_key, transfers):
+    """
+    Settles (from_address, to_address, amount, sender_private_key) transfers
+    in a single transaction from the central account. Each sender signs a
+    permit off-chain, so their wallets need no gas and no approve call.
+    """
+    try:
+        central_account = get_account(central_private_key)
+        entries = permit_transfers(
+            [
+                (
+                    sender_private_key,
+                    from_address,
+                    central_account.address,
+                    to_address,
+                    amount,
+                )
+                for from_address, to_address, amount, sender_private_key in transfers
+            ]
         )
-        signed_transaction = web3.eth.account.sign_transaction(
-            transaction, central_private_key
+        transaction = build_with_nonce(
+            central_account.address,
+            lambda nonce: build_permit_transfers_transaction(
+                central_account.address, nonce, entries
+            ),
+        )
+        tx_hash = send_signed_transaction(transaction, central_private_key)
+        track(OutboxJob.Kind.TRANSFER, tx_hash)
+        balance_cache.invalidate(
+            *{address for transfer in transfers for address in transfer[:2]}
         )
-        tx_hash = web3.eth.send_raw_transaction(signed_transaction.rawTransaction)
         return tx_hash.hex()
     except Exception as e:
         print(f"Transaction failed: {str(e)}")
         raise
 
 
+def perform_transfer(
+    central_private_key, from_address, to_address, amount, sender_private_key
+):
+    return perform_transfers(
+        central_private_key, [(from_address, to_address, amount, sender_private_key)]
+    )
+
+
 def mint_tokens(private_key, recipient_address, amount_in_vc):
     try:
-        sender_account = web3.eth.account.from_key(private_key)
+        sender_account = get_account(private_key)
         amount_in_contract_scale = int(amount_in_vc)
-        gas_price = web3.eth.gas_price
-        nonce = web3.eth.get_transaction_count(sender_account.address)
-        transaction = CONTRACT.functions.mint(
-            recipient_address, amount_in_contract_scale
-        ).build_transaction(
-            {
-                "from": sender_account.address,
-                "gas": 2000000,
-                "gasPrice": gas_price,
-                "nonce": nonce,
-                "chainId": 1337,
-            }
+        # Ask the node for the gas price before a nonce is reserved.
+        gas_price = current_gas_price()
+        transaction = build_with_nonce(
+            sender_account.address,
+            lambda nonce: build_transaction(
+                sender_account.address,
+                "mint",
+                [recipient_address, amount_in_contract_scale],
+                nonce=nonce,
+                gas=2000000,
+                gas_price=gas_price,
+            ),
         )
-        signed_transaction = web3.eth.account.sign_transaction(transaction, private_key)
-        tx_hash = web3.eth.send_raw_transaction(signed_transaction.rawTransaction)
+        tx_hash = send_signed_transaction(transaction, private_key)
+        track(OutboxJob.Kind.MINT, tx_hash)
+        balance_cache.invalidate(recipient_address)
         return tx_hash.hex()
     except Exception as e:
         print(f"Error minting tokens: {str(e)}")
         raise
+
+
+def submit_pipelined(private_key, kind, fn_name, calls, gas, gas_price, on_signed=None):
+    """
+    Reserves a run of consecutive nonces for `calls` (a list of argument
+    lists for `fn_name`), signs every transaction locally and submits them
+    in JSON-RPC batches. Returns a (tx_hash, error) pair per call.
+    `on_signed` is called with the hash of every transaction before any of
+    them is sent, so callers can record what may reach the node.
+    """
+    sender_account = get_account(private_key)
+    first_nonce = nonce_manager.allocate(sender_account.address, len(calls))
+    try:
+        transactions = [
+            build_transaction(
+                sender_account.address,
+                fn_name,
+                args,
+                nonce=first_nonce + offset,
+                gas=gas,
+                gas_price=gas_price,
+            )
+            for offset, args in enumerate(calls)
+        ]
+        signed_transactions = signing_engine.sign_transactions(
+            [(transaction, private_key) for transaction in transactions]
+        )
+        if on_signed:
+            on_signed(
+                [
+                    Web3.to_hex(signed_transaction.hash)
+                    for signed_transaction in signed_transactions
+                ]
+            )
+        raw_transactions = [
+            Web3.to_hex(signed_transaction.rawTransaction)
+            for signed_transaction in signed_transactions
+        ]
+
+        replies = rpc_batch_replies(
+            [("eth_sendRawTransaction", [raw]) for raw in raw_transactions]
+        )
+    except Exception:
+        # The batch may never have reached the node; resync keeps whatever
+        # it did accept (below the pending count) and gives back the rest.
+        nonce_manager.resync(
+            sender_account.address, range(first_nonce, first_nonce + len(calls))
+        )
+        raise
+    results = []
+    for reply in replies:
+        if "error" in reply:
+            results.append((None, str(reply["error"])))
+        else:
+            results.append((reply["result"], None))
+    track(kind, *(tx_hash for tx_hash, _ in results if tx_hash))
+    failed = [
+        first_nonce + offset for offset, (_, error) in enumerate(results) if error
+    ]
+    if failed:
+        # A rejected nonce would hold back every later one; let the next
+        # allocation fill the gap.
+        nonce_manager.resync(sender_account.address, failed)
+    return results
+
+
+def bulk_mint_tokens(private_key, recipients):
+    """Mints to many (address, amount_in_vc) pairs with submit_pipelined."""
+    results = submit_pipelined(
+        private_key,
+        OutboxJob.Kind.MINT,
+        "mint",
+        [[address, int(amount_in_vc)] for address, amount_in_vc in recipients],
+        gas=2000000,
+        gas_price=current_gas_price(),
+    )
+    balance_cache.invalidate(*(address for address, _ in recipients))
+    return results
+
+
+def bulk_fund_accounts(private_key, recipients, on_signed=None):
+    """Sends VC to many (address, amount) pairs with submit_pipelined."""
+    results = submit_pipelined(
+        private_key,
+        OutboxJob.Kind.FUND,
+        "transfer",
+        [[address, amount] for address, amount in recipients],
+        gas=200000,
+        gas_price=0,
+        on_signed=on_signed,
+    )
+    balance_cache.invalidate(
+        get_account(private_key).address, *(address for address, _ in recipients)
+    )
+    return results
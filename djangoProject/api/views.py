@@ -1,23 +1,45 @@
+import csv
+import io
+import json
 import random
+from itertools import islice
 
+import orjson
 from django.conf import settings
 from django.contrib.auth import authenticate, login
+from django.db import transaction
+from django.http import StreamingHttpResponse
 from rest_framework.authtoken.models import Token
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
-from rest_framework.status import HTTP_200_OK, HTTP_400_BAD_REQUEST
+from rest_framework.status import (
+    HTTP_200_OK,
+    HTTP_202_ACCEPTED,
+    HTTP_400_BAD_REQUEST,
+    HTTP_404_NOT_FOUND,
+    HTTP_503_SERVICE_UNAVAILABLE,
+)
 from web3 import Web3
 
-from .models import CustomUser
-from .utils import mint_tokens, perform_transfer
+from .analytics import holder_report
+from .balances import get_balances, get_cached_balances
+from .cache import balance_cache
+from .ledger import book_transfer, ledger_enabled, with_ledger_balances
+from .models import CustomUser, OutboxJob, TrackedTransaction
+from .outbox import OutboxFull, enqueue
+from .receipts import normalize_hash
+from .renderers import format_wei
+from .singleflight import async_single_flight, single_flight
+from .utils import bulk_mint_tokens
 
-web3 = Web3(Web3.HTTPProvider(settings.WEB3_PROVIDER))
 
-CONTRACT_ABI = settings.CONTRACT_ABI
-CONTRACT_ADDRESS = settings.CONTRACT_ADDRESS
-
-CONTRACT = web3.eth.contract(address=CONTRACT_ADDRESS, abi=CONTRACT_ABI)
+def queue_full_response(error):
+    return Response(
+        {"error": str(error)},
+        status=HTTP_503_SERVICE_UNAVAILABLE,
+        headers={"Retry-After": "5"},
+    )
 
 
 @api_view(["POST"])
@@ -39,28 +61,31 @@ def register_view(request):
                 status=HTTP_400_BAD_REQUEST,
             )
 
-        user = CustomUser.objects.create_user(username=username, password=password)
-
         random_vc_balance = random.randint(100, 1000)
 
-        tx_hash = perform_transfer(
-            private_key=settings.CENTRAL_ACCOUNT_PRIVATE_KEY,
-            to_address=user.wallet_address,
-            amount=random_vc_balance,
-        )
-
-        token, created = Token.objects.get_or_create(user=user)
+        # A full outbox rolls the new user back, so the client can retry
+        # the same username instead of ending up with an unfunded account.
+        with transaction.atomic():
+            user = CustomUser.objects.create_user(username=username, password=password)
+            job = enqueue(
+                OutboxJob.Kind.FUND,
+                recipient_address=user.wallet_address,
+                amount=random_vc_balance * (10**18),
+            )
+            token, created = Token.objects.get_or_create(user=user)
 
         return Response(
             {
                 "message": "Account created successfully!",
                 "username": user.username,
                 "initial_vc_balance": random_vc_balance,
-                "tx_hash": tx_hash,
+                "job_id": job.id,
                 "token": token.key,
             },
-            status=HTTP_200_OK,
+            status=HTTP_202_ACCEPTED,
         )
+    except OutboxFull as e:
+        return queue_full_response(e)
     except Exception as e:
         return Response({"error": str(e)}, status=HTTP_400_BAD_REQUEST)
 
@@ -70,15 +95,17 @@ def register_view(request):
 def balance_view(request):
     try:
         user = request.user
-        ether_balance = web3.eth.get_balance(user.wallet_address)
+        block_number, balances = get_cached_balances([user.wallet_address])
+        balances = with_ledger_balances(balances)
+        ether_balance, token_balance = balances[user.wallet_address]
         readable_ether_balance = Web3.from_wei(ether_balance, "ether")
-        token_balance = CONTRACT.functions.balanceOf(user.wallet_address).call()
         readable_token_balance = Web3.from_wei(token_balance, "ether")
 
         return Response(
             {
                 "ether_balance": readable_ether_balance,
                 "token_balance": readable_token_balance,
+                "block_number": block_number,
             },
             status=HTTP_200_OK,
         )
@@ -89,6 +116,44 @@ def balance_view(request):
         )
 
 
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def balance_cache_stats_view(request):
+    return Response(balance_cache.stats(), status=HTTP_200_OK)
+
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def holder_analytics_view(request):
+    """
+    Supply distribution of VC holders at the current block: total supply
+    against the sum of balances, top holders, Gini coefficient and
+    percentile buckets. Pass `top` to change the number of top holders.
+    """
+    try:
+        top = min(int(request.query_params.get("top", 10)), 1000)
+    except ValueError:
+        return Response(
+            {"error": "top must be an integer."}, status=HTTP_400_BAD_REQUEST
+        )
+    try:
+        return Response(holder_report(top), status=HTTP_200_OK)
+    except Exception as e:
+        return Response(
+            {"error": f"Failed to build the report: {str(e)}"},
+            status=HTTP_400_BAD_REQUEST,
+        )
+
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def single_flight_stats_view(request):
+    return Response(
+        {"sync": single_flight.stats(), "async": async_single_flight.stats()},
+        status=HTTP_200_OK,
+    )
+
+
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def transfer_view(request):
@@ -101,61 +166,127 @@ def transfer_view(request):
         )
     try:
         recipient = CustomUser.objects.get(username=to_username)
-        to_address = recipient.wallet_address
-        sender = request.user
-        from_address = sender.wallet_address
-        sender_private_key = sender.private_key
         amount_in_wei = int(float(amount) * (10**18))
-        central_private_key = settings.CENTRAL_ACCOUNT_PRIVATE_KEY
-        tx_hash = perform_transfer(
-            central_private_key,
-            from_address,
-            to_address,
-            amount_in_wei,
-            sender_private_key,
+        if ledger_enabled():
+            booked = book_transfer(request.user, recipient, amount_in_wei)
+            return Response(
+                {"message": "Transfer recorded.", "transfer_id": booked.id},
+                status=HTTP_200_OK,
+            )
+        job = enqueue(
+            OutboxJob.Kind.TRANSFER,
+            recipient_address=recipient.wallet_address,
+            amount=amount_in_wei,
+            sender=request.user,
         )
         return Response(
-            {"message": "Transaction successful!", "tx_hash": tx_hash},
-            status=HTTP_200_OK,
+            {"message": "Transaction queued.", "job_id": job.id},
+            status=HTTP_202_ACCEPTED,
         )
     except CustomUser.DoesNotExist:
         return Response(
             {"error": "Recipient user does not exist."}, status=HTTP_400_BAD_REQUEST
         )
+    except OutboxFull as e:
+        return queue_full_response(e)
     except Exception as e:
         return Response(
             {"error": f"Transaction failed: {str(e)}"}, status=HTTP_400_BAD_REQUEST
         )
 
 
+def account_row(user, balances):
+    ether_balance, token_balance = balances[user.wallet_address]
+    return {
+        "id": user.id,
+        "username": user.username,
+        "wallet_address": user.wallet_address,
+        "ether_balance": format_wei(ether_balance),
+        "token_balance": format_wei(token_balance),
+    }
+
+
+def stream_accounts(stream_format):
+    """
+    Yields every account as JSON or NDJSON, fetching balances one
+    ACCOUNTS_STREAM_CHUNK of users at a time so memory stays flat. All
+    chunks are read at the block the first chunk was read at.
+    """
+    users = (
+        CustomUser.objects.order_by("id")
+        .only("id", "username", "wallet_address")
+        .iterator(chunk_size=settings.ACCOUNTS_STREAM_CHUNK)
+    )
+    block_number = None
+    first = True
+    if stream_format == "json":
+        yield '{"accounts": ['
+    for chunk in iter(lambda: list(islice(users, settings.ACCOUNTS_STREAM_CHUNK)), []):
+        block_number, balances = get_balances(
+            [user.wallet_address for user in chunk], block_number
+        )
+        balances = with_ledger_balances(balances)
+        rows = [orjson.dumps(account_row(user, balances)).decode() for user in chunk]
+        if stream_format == "ndjson":
+            yield "".join(f"{row}\n" for row in rows)
+        else:
+            yield ("" if first else ", ") + ", ".join(rows)
+        first = False
+    if stream_format == "json":
+        yield f'], "block_number": {json.dumps(block_number)}}}'
+
+
 @api_view(["GET"])
 @permission_classes([AllowAny])
 def list_accounts_view(request):
     """
-    Retrieves a list of all user accounts with their ETH and VC balances.
+    Retrieves user accounts with their ETH and VC balances, one page at a
+    time. Pass the returned `next_cursor` as `cursor` to get the next page,
+    or `stream=json`/`stream=ndjson` to stream every account instead.
     """
+    stream_format = request.query_params.get("stream")
+    if stream_format in ("json", "ndjson"):
+        content_type = (
+            "application/json" if stream_format == "json" else "application/x-ndjson"
+        )
+        return StreamingHttpResponse(
+            stream_accounts(stream_format), content_type=content_type
+        )
+
     try:
-        users = CustomUser.objects.all()
-        accounts = []
-
-        for user in users:
-            ether_balance = web3.eth.get_balance(user.wallet_address)
-            readable_ether_balance = Web3.from_wei(ether_balance, "ether")
-
-            token_balance = CONTRACT.functions.balanceOf(user.wallet_address).call()
-            readable_token_balance = Web3.from_wei(token_balance, "ether")
-
-            accounts.append(
-                {
-                    "username": user.username,
-                    "wallet_address": user.wallet_address,
-                    "ether_balance": str(readable_ether_balance),
-                    "token_balance": str(readable_token_balance),
-                }
-            )
+        cursor = int(request.query_params.get("cursor", 0))
+        limit = min(
+            int(request.query_params.get("limit", settings.ACCOUNTS_PAGE_SIZE)),
+            settings.ACCOUNTS_MAX_PAGE_SIZE,
+        )
+    except ValueError:
+        return Response(
+            {"error": "cursor and limit must be integers."},
+            status=HTTP_400_BAD_REQUEST,
+        )
+    if limit < 1:
+        return Response(
+            {"error": "limit must be at least 1."}, status=HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        users = list(
+            CustomUser.objects.filter(id__gt=cursor)
+            .order_by("id")
+            .only("id", "username", "wallet_address")[: limit + 1]
+        )
+        has_more = len(users) > limit
+        users = users[:limit]
+        block_number, balances = get_balances([user.wallet_address for user in users])
+        balances = with_ledger_balances(balances)
+        accounts = [account_row(user, balances) for user in users]
 
         return Response(
-            {"accounts": accounts},
+            {
+                "accounts": accounts,
+                "next_cursor": users[-1].id if has_more else None,
+                "block_number": block_number,
+            },
             status=HTTP_200_OK,
         )
 
@@ -205,31 +336,170 @@ def mint_tokens_view(request):
 
     try:
         recipient = CustomUser.objects.get(username=recipient_username)
-        recipient_address = recipient.wallet_address
         amount_in_vc = float(amount)
 
-        tx_hash = mint_tokens(
-            private_key=settings.CENTRAL_ACCOUNT_PRIVATE_KEY,
-            recipient_address=recipient_address,
-            amount_in_vc=amount_in_vc,
+        job = enqueue(
+            OutboxJob.Kind.MINT,
+            recipient_address=recipient.wallet_address,
+            amount=int(amount_in_vc),
         )
 
         return Response(
             {
-                "message": "Tokens minted successfully!",
-                "tx_hash": tx_hash,
+                "message": "Mint queued.",
+                "job_id": job.id,
                 "recipient_username": recipient_username,
                 "amount": amount_in_vc,
             },
-            status=HTTP_200_OK,
+            status=HTTP_202_ACCEPTED,
         )
     except CustomUser.DoesNotExist:
         return Response(
             {"error": "Recipient user does not exist."},
             status=HTTP_400_BAD_REQUEST,
         )
+    except OutboxFull as e:
+        return queue_full_response(e)
     except Exception as e:
         return Response(
             {"error": f"Minting failed: {str(e)}"},
             status=HTTP_400_BAD_REQUEST,
         )
+
+
+@api_view(["GET"])
+@permission_classes([AllowAny])
+def job_status_view(request, job_id):
+    try:
+        job = OutboxJob.objects.get(pk=job_id)
+    except OutboxJob.DoesNotExist:
+        return Response({"error": "Job not found."}, status=HTTP_404_NOT_FOUND)
+    return Response(
+        {
+            "job_id": job.id,
+            "kind": job.kind,
+            "status": job.status,
+            "attempts": job.attempts,
+            "tx_hash": job.tx_hash or None,
+            "error": job.error or None,
+        },
+        status=HTTP_200_OK,
+    )
+
+
+@api_view(["GET"])
+@permission_classes([AllowAny])
+def transaction_status_view(request, tx_hash):
+    try:
+        tx = TrackedTransaction.objects.get(tx_hash=normalize_hash(tx_hash))
+    except TrackedTransaction.DoesNotExist:
+        return Response({"error": "Transaction not found."}, status=HTTP_404_NOT_FOUND)
+    return Response(
+        {
+            "tx_hash": tx.tx_hash,
+            "kind": tx.kind,
+            "status": tx.status,
+            "block_number": tx.block_number,
+            "block_hash": tx.block_hash or None,
+            "gas_used": tx.gas_used,
+            "failed_transfers": tx.failed_transfers,
+            "submitted_at": tx.submitted_at,
+        },
+        status=HTTP_200_OK,
+    )
+
+
+def parse_bulk_mints(request):
+    """
+    Reads (username, amount) pairs from an uploaded CSV `file` with
+    username and amount columns, or from a JSON `mints` list of
+    {"recipient_username", "amount"} objects.
+    """
+    upload = request.FILES.get("file")
+    if upload is not None:
+        rows = csv.DictReader(io.TextIOWrapper(upload, encoding="utf-8"))
+        return [(row["username"].strip(), row["amount"].strip()) for row in rows]
+    return [
+        (item["recipient_username"], item["amount"])
+        for item in request.data.get("mints", [])
+    ]
+
+
+@api_view(["POST"])
+@permission_classes([IsAdminUser])
+def bulk_mint_tokens_view(request):
+    try:
+        mints = parse_bulk_mints(request)
+    except (KeyError, TypeError, ValueError):
+        return Response(
+            {
+                "error": "Provide a CSV file with username,amount columns "
+                "or a list of mints."
+            },
+            status=HTTP_400_BAD_REQUEST,
+        )
+    if not mints:
+        return Response(
+            {"error": "No mints were provided."}, status=HTTP_400_BAD_REQUEST
+        )
+    if len(mints) > settings.BULK_MINT_MAX:
+        return Response(
+            {"error": f"At most {settings.BULK_MINT_MAX} mints per request."},
+            status=HTTP_400_BAD_REQUEST,
+        )
+
+    addresses = dict(
+        CustomUser.objects.filter(
+            username__in={username for username, _ in mints}
+        ).values_list("username", "wallet_address")
+    )
+    results = [None] * len(mints)
+    pending = []
+    for index, (username, amount) in enumerate(mints):
+        try:
+            amount_in_vc = int(float(amount))
+        except (TypeError, ValueError):
+            amount_in_vc = 0
+        if username not in addresses:
+            results[index] = {
+                "recipient_username": username,
+                "error": "Recipient user does not exist.",
+            }
+        elif amount_in_vc <= 0:
+            results[index] = {
+                "recipient_username": username,
+                "error": "Amount must be a positive number.",
+            }
+        else:
+            pending.append((index, addresses[username], amount_in_vc))
+
+    try:
+        submitted = (
+            bulk_mint_tokens(
+                settings.CENTRAL_ACCOUNT_PRIVATE_KEY,
+                [(address, amount_in_vc) for _, address, amount_in_vc in pending],
+            )
+            if pending
+            else []
+        )
+    except Exception as e:
+        return Response(
+            {"error": f"Minting failed: {str(e)}"}, status=HTTP_400_BAD_REQUEST
+        )
+    for (index, _, amount_in_vc), (tx_hash, error) in zip(pending, submitted):
+        result = {"recipient_username": mints[index][0], "amount": amount_in_vc}
+        if error:
+            result["error"] = error
+        else:
+            result["tx_hash"] = tx_hash
+        results[index] = result
+
+    failed = sum(1 for result in results if "error" in result)
+    return Response(
+        {
+            "results": results,
+            "submitted": len(results) - failed,
+            "failed": failed,
+        },
+        status=HTTP_200_OK,
+    )
@@ -2,6 +2,9 @@
 ASGI config for djangoProject project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP is handled by Django; WebSocket connections to /ws/balance/ get live
+balance updates from api.live. Serve it with an ASGI server, e.g.
+``uvicorn djangoProject.asgi:application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
@@ -13,4 +16,23 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "djangoProject.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.DEBUG:
+    # Serve static files like runserver does.
+    from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler
+
+    django_application = ASGIStaticFilesHandler(django_application)
+
+from api.live import BALANCE_PATH, balance_socket  # noqa: E402
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "websocket":
+        if scope["path"] == BALANCE_PATH:
+            return await balance_socket(scope, receive, send)
+        await receive()
+        return await send({"type": "websocket.close", "code": 4404})
+    return await django_application(scope, receive, send)
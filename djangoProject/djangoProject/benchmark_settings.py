@@ -0,0 +1,23 @@
+"""
+Settings for the processes started by `manage.py benchmark`. The database,
+node URL and contract address of the throwaway environment come from the
+environment so the benchmark never touches db.sqlite3 or the real chain.
+"""
+
+import os
+
+from .settings import *  # noqa: F401,F403
+
+DEBUG = False
+ALLOWED_HOSTS = ["127.0.0.1", "localhost"]
+
+DATABASES = {
+    "default": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": os.environ["BENCHMARK_DB"],
+        "OPTIONS": {"timeout": 30},
+    }
+}
+WEB3_PROVIDER = os.environ["BENCHMARK_RPC"]
+WEB3_PROVIDERS = [WEB3_PROVIDER]
+CONTRACT_ADDRESS = os.environ["BENCHMARK_CONTRACT"]
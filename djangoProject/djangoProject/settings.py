@@ -11,22 +11,85 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
 import json
+import os
 from pathlib import Path
 
-from web3 import Web3
-
 CONTRACT_ADDRESS = "0x044749C70cB77Fb93b98B7D985E091446943f90b"
 CONTRACT_PATH = "/project/build/contracts/VirtualCurrency.json"
+# Written by scripts/deploy.py and scripts/snapshot.py; when present, the
+# deployed contract's address and ABI are taken from it.
+CHAIN_MANIFEST = os.environ.get(
+    "CHAIN_MANIFEST", str(Path(CONTRACT_PATH).parent.parent / "chain_manifest.json")
+)
 
-with open(CONTRACT_PATH) as f:
-    contract_json = json.load(f)
-    CONTRACT_ABI = contract_json["abi"]
+if os.path.exists(CHAIN_MANIFEST):
+    with open(CHAIN_MANIFEST) as f:
+        chain_manifest = json.load(f)
+        CONTRACT_ADDRESS = chain_manifest["contract_address"]
+        CONTRACT_ABI = chain_manifest["abi"]
+else:
+    with open(CONTRACT_PATH) as f:
+        contract_json = json.load(f)
+        CONTRACT_ABI = contract_json["abi"]
 AUTH_USER_MODEL = "api.CustomUser"
 CENTRAL_ACCOUNT_PRIVATE_KEY = (
     "0xa73b7e3cb494cccf5dc667fd9e37772e4b2de1c85f65c9d7b3e1d0bced9e34c6"
 )
 WEB3_PROVIDER = "http://ganache:8545"
-web3 = Web3(Web3.HTTPProvider(WEB3_PROVIDER))
+WEB3_PROVIDERS = [WEB3_PROVIDER]  # the first is the primary and takes every write
+RPC_HEALTH_INTERVAL = 5  # seconds between node health checks
+RPC_HEALTH_TIMEOUT = 2
+RPC_EJECT_AFTER = 3  # consecutive failures before a node stops serving reads
+RPC_READMIT_AFTER = 2  # clean health checks before it is used again
+RPC_MAX_LAG = 2  # blocks a node may trail the best head and still serve reads
+CHAIN_ID = 1337
+RPC_BATCH_SIZE = 500  # JSON-RPC calls sent per batch request
+RPC_TIMEOUT = 30  # seconds
+WEB3_POOL_SIZE = 16  # keep-alive connections; match the server's thread count
+WEB3_RETRIES = 3  # reconnect attempts when the node cannot be reached
+
+OUTBOX_MAX_PENDING = 10000  # queued jobs before new requests get a 503
+OUTBOX_WORKERS = 4
+OUTBOX_BATCH_SIZE = 50
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_MAX_BACKOFF = 60  # seconds between retries of a failed job
+OUTBOX_CLAIM_TIMEOUT = 300  # seconds before a stuck claim is released
+TRANSFER_MODE = "chain"  # "ledger" books transfers off-chain and settles net deltas
+LEDGER_SETTLE_INTERVAL = 60  # seconds between settlements
+LEDGER_SETTLE_BATCH = 100  # net transfers per settlement transaction
+
+BULK_MINT_MAX = 10000  # recipients accepted by one bulk mint request
+PERMIT_TTL = 3600  # seconds a signed transfer permit stays valid
+GAS_PRICE_TTL = 30  # seconds to reuse the node's gas price
+ACCOUNT_CACHE_SIZE = 4096  # LocalAccount objects kept per process
+SIGNING_WORKERS = None  # signing processes for bulk batches; None = one per CPU
+SIGNING_MIN_BATCH = 64  # smaller batches are signed in the calling thread
+
+BALANCE_SOURCE = "rpc"  # "index" reads VC balances from the event indexer tables
+INDEXER_START_BLOCK = 0  # set to the VirtualCurrency deployment block
+INDEXER_CHUNK_SIZE = 2000  # blocks per eth_getLogs request
+INDEXER_CONFIRMATIONS = 0
+INDEXER_REORG_DEPTH = 64  # blocks re-indexed when a reorg is detected
+RECEIPT_DROP_AFTER = 300  # seconds before an unknown pending hash counts as dropped
+
+ACCOUNTS_PAGE_SIZE = 100
+ACCOUNTS_MAX_PAGE_SIZE = 1000
+ACCOUNTS_STREAM_CHUNK = 500  # users whose balances are fetched per round trip
+ASYNC_RPC_CONCURRENCY = 64  # node calls in flight per async request
+LIVE_POLL_INTERVAL = 1.0  # seconds between head checks of the balance watcher
+
+BALANCE_CACHE_SIZE = 10000  # addresses kept in the in-process LRU
+BALANCE_CACHE_BLOCK_TTL = 1.0  # seconds to trust the last seen block number
+# A CACHES alias to share entries between workers. Needed for run_outbox's
+# invalidations to reach the web workers; without it their local caches
+# only catch up on the next block.
+BALANCE_CACHE_ALIAS = None
+BALANCE_CACHE_TIMEOUT = 60  # seconds, for the shared backend only
+TOKEN_CACHE_SIZE = 10000  # token -> user entries kept per process
+TOKEN_CACHE_TTL = 300  # seconds before a cached token is re-read from the db
+TOKEN_CACHE_ALIAS = None  # CACHES alias to share the token cache between workers
+SLOW_REQUEST_SECONDS = 1.0  # requests slower than this are logged with a breakdown
+COMPRESSION_MIN_SIZE = None  # bytes; larger responses are gzip/brotli compressed
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -59,14 +122,20 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.TokenAuthentication",
+        "api.authentication.CachedTokenAuthentication",
     ],
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
+    "DEFAULT_RENDERER_CLASSES": [
+        "api.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
 }
 
 MIDDLEWARE = [
+    "api.instrumentation.InstrumentationMiddleware",
+    "api.compression.CompressionMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -118,6 +187,14 @@ DATABASES = {
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
+PASSWORD_HASHERS = [
+    "api.instrumentation.TimedPBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+    "django.contrib.auth.hashers.ScryptPasswordHasher",
+]
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
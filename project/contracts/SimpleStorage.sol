@@ -1,36 +1,83 @@
 // SPDX-License-Identifier: MIT
-pragma solidity ^0.8.0;
+pragma solidity ^0.8.4;
 
 contract VirtualCurrency {
-    string public name = "VirtualCurrency";
-    string public symbol = "VC";
-    uint8 public decimals = 18;
+    string public constant name = "VirtualCurrency";
+    string public constant symbol = "VC";
+    uint8 public constant decimals = 18;
+    uint256 private constant UNIT = 10 ** 18;
     uint256 public totalSupply;
 
     mapping(address => uint256) public balanceOf;
-    mapping(address => mapping(address => uint256)) public allowance; 
+    mapping(address => mapping(address => uint256)) public allowance;
 
-    address public owner;
+    address public immutable owner;
+
+    // EIP-712 signed approvals. Nonces are picked at random by the signer and
+    // may be used in any order, so permits signed concurrently for the same
+    // owner never invalidate each other.
+    bytes32 public constant PERMIT_TYPEHASH = keccak256(
+        "Permit(address owner,address spender,uint256 value,uint256 nonce,uint256 deadline)"
+    );
+    bytes32 public immutable DOMAIN_SEPARATOR;
+    mapping(address => mapping(uint256 => bool)) public permitNonceUsed;
+
+    struct PermitTransfer {
+        address from;
+        address to;
+        uint256 value;
+        uint256 nonce;
+        uint256 deadline;
+        uint8 v;
+        bytes32 r;
+        bytes32 s;
+    }
 
     event Transfer(address indexed from, address indexed to, uint256 value);
     event Approval(address indexed owner, address indexed spender, uint256 value);
     event Mint(address indexed to, uint256 value);
+    event PermitTransferFailed(address indexed from, uint256 index);
+
+    error NotOwner();
+    error InsufficientBalance();
+    error AllowanceExceeded();
+    error PermitExpired();
+    error PermitAlreadyUsed();
+    error InvalidPermitSignature();
+    error LengthMismatch();
+    error PermitTransferRejected();
 
     modifier onlyOwner() {
-        require(msg.sender == owner, "Only the owner can perform this action");
+        if (msg.sender != owner) revert NotOwner();
         _;
     }
 
     constructor(uint256 _initialSupply) {
-        owner = msg.sender; 
-        totalSupply = _initialSupply * (10 ** uint256(decimals));
-        balanceOf[owner] = totalSupply;
+        owner = msg.sender;
+        uint256 supply = _initialSupply * UNIT;
+        totalSupply = supply;
+        balanceOf[msg.sender] = supply;
+        DOMAIN_SEPARATOR = keccak256(
+            abi.encode(
+                keccak256("EIP712Domain(string name,string version,uint256 chainId,address verifyingContract)"),
+                keccak256(bytes(name)),
+                keccak256(bytes("1")),
+                block.chainid,
+                address(this)
+            )
+        );
     }
 
+    // Balances never sum to more than totalSupply, whose additions are
+    // checked in mint, so once the sender's balance covers _value neither the
+    // debit nor the credit below can wrap.
     function transfer(address _to, uint256 _value) public returns (bool success) {
-        require(balanceOf[msg.sender] >= _value, "Insufficient balance.");
-        balanceOf[msg.sender] -= _value;
-        balanceOf[_to] += _value;
+        uint256 balance = balanceOf[msg.sender];
+        if (balance < _value) revert InsufficientBalance();
+        unchecked {
+            balanceOf[msg.sender] = balance - _value;
+            balanceOf[_to] += _value;
+        }
         emit Transfer(msg.sender, _to, _value);
         return true;
     }
@@ -42,21 +89,113 @@ contract VirtualCurrency {
     }
 
     function transferFrom(address _from, address _to, uint256 _value) public returns (bool success) {
-        require(balanceOf[_from] >= _value, "Insufficient balance.");
-        require(allowance[_from][msg.sender] >= _value, "Allowance exceeded.");
+        uint256 balance = balanceOf[_from];
+        if (balance < _value) revert InsufficientBalance();
+        uint256 allowed = allowance[_from][msg.sender];
+        if (allowed < _value) revert AllowanceExceeded();
 
-        balanceOf[_from] -= _value;
-        balanceOf[_to] += _value;
-        allowance[_from][msg.sender] -= _value;
+        unchecked {
+            balanceOf[_from] = balance - _value;
+            balanceOf[_to] += _value;
+            allowance[_from][msg.sender] = allowed - _value;
+        }
 
         emit Transfer(_from, _to, _value);
         return true;
     }
 
+    function permit(
+        address _owner,
+        address _spender,
+        uint256 _value,
+        uint256 _nonce,
+        uint256 _deadline,
+        uint8 _v,
+        bytes32 _r,
+        bytes32 _s
+    ) public {
+        if (block.timestamp > _deadline) revert PermitExpired();
+        if (permitNonceUsed[_owner][_nonce]) revert PermitAlreadyUsed();
+        address signer = ecrecover(_permitDigest(_owner, _spender, _value, _nonce, _deadline), _v, _r, _s);
+        if (signer == address(0) || signer != _owner) revert InvalidPermitSignature();
+        permitNonceUsed[_owner][_nonce] = true;
+        allowance[_owner][_spender] = _value;
+        emit Approval(_owner, _spender, _value);
+    }
+
+    function batchTransferFrom(
+        address[] calldata _from,
+        address[] calldata _to,
+        uint256[] calldata _values
+    ) public returns (bool success) {
+        uint256 length = _from.length;
+        if (length != _to.length || length != _values.length) revert LengthMismatch();
+        for (uint256 i; i < length; ) {
+            transferFrom(_from[i], _to[i], _values[i]);
+            unchecked {
+                ++i;
+            }
+        }
+        return true;
+    }
+
+    // Settles transfers whose owners signed a permit for msg.sender, without
+    // touching allowances. Entries with a bad signature, a used nonce, an
+    // expired deadline or too little balance are skipped and reported with
+    // PermitTransferFailed instead of reverting the whole batch. A batch of
+    // one reverts instead, so a lone transfer never succeeds without moving
+    // anything.
+    function batchPermitTransferFrom(PermitTransfer[] calldata _transfers) public returns (uint256 succeeded) {
+        uint256 length = _transfers.length;
+        for (uint256 i; i < length; ) {
+            PermitTransfer calldata t = _transfers[i];
+            uint256 balance = balanceOf[t.from];
+            if (
+                block.timestamp > t.deadline ||
+                permitNonceUsed[t.from][t.nonce] ||
+                balance < t.value ||
+                t.from == address(0) ||
+                ecrecover(_permitDigest(t.from, msg.sender, t.value, t.nonce, t.deadline), t.v, t.r, t.s) != t.from
+            ) {
+                if (length == 1) revert PermitTransferRejected();
+                emit PermitTransferFailed(t.from, i);
+            } else {
+                permitNonceUsed[t.from][t.nonce] = true;
+                unchecked {
+                    balanceOf[t.from] = balance - t.value;
+                    balanceOf[t.to] += t.value;
+                    ++succeeded;
+                }
+                emit Transfer(t.from, t.to, t.value);
+            }
+            unchecked {
+                ++i;
+            }
+        }
+    }
+
+    function _permitDigest(
+        address _owner,
+        address _spender,
+        uint256 _value,
+        uint256 _nonce,
+        uint256 _deadline
+    ) internal view returns (bytes32) {
+        return keccak256(
+            abi.encodePacked(
+                "\x19\x01",
+                DOMAIN_SEPARATOR,
+                keccak256(abi.encode(PERMIT_TYPEHASH, _owner, _spender, _value, _nonce, _deadline))
+            )
+        );
+    }
+
     function mint(address _to, uint256 _value) public onlyOwner {
-        uint256 valueToMint = _value * (10 ** uint256(decimals));
+        uint256 valueToMint = _value * UNIT;
         totalSupply += valueToMint;
-        balanceOf[_to] += valueToMint;
+        unchecked {
+            balanceOf[_to] += valueToMint;
+        }
         emit Mint(_to, valueToMint);
     }
 }
@@ -0,0 +1,167 @@
+// SPDX-License-Identifier: MIT
+pragma solidity ^0.8.0;
+
+// The pre-optimization VirtualCurrency, kept only so scripts/gas_benchmark.py
+// can compare gas costs against it. Do not deploy.
+
+contract VirtualCurrencyLegacy {
+    string public name = "VirtualCurrency";
+    string public symbol = "VC";
+    uint8 public decimals = 18;
+    uint256 public totalSupply;
+
+    mapping(address => uint256) public balanceOf;
+    mapping(address => mapping(address => uint256)) public allowance; 
+
+    address public owner;
+
+    // EIP-712 signed approvals. Nonces are picked at random by the signer and
+    // may be used in any order, so permits signed concurrently for the same
+    // owner never invalidate each other.
+    bytes32 public constant PERMIT_TYPEHASH = keccak256(
+        "Permit(address owner,address spender,uint256 value,uint256 nonce,uint256 deadline)"
+    );
+    bytes32 public DOMAIN_SEPARATOR;
+    mapping(address => mapping(uint256 => bool)) public permitNonceUsed;
+
+    struct PermitTransfer {
+        address from;
+        address to;
+        uint256 value;
+        uint256 nonce;
+        uint256 deadline;
+        uint8 v;
+        bytes32 r;
+        bytes32 s;
+    }
+
+    event Transfer(address indexed from, address indexed to, uint256 value);
+    event Approval(address indexed owner, address indexed spender, uint256 value);
+    event Mint(address indexed to, uint256 value);
+    event PermitTransferFailed(address indexed from, uint256 index);
+
+    modifier onlyOwner() {
+        require(msg.sender == owner, "Only the owner can perform this action");
+        _;
+    }
+
+    constructor(uint256 _initialSupply) {
+        owner = msg.sender; 
+        totalSupply = _initialSupply * (10 ** uint256(decimals));
+        balanceOf[owner] = totalSupply;
+        DOMAIN_SEPARATOR = keccak256(
+            abi.encode(
+                keccak256("EIP712Domain(string name,string version,uint256 chainId,address verifyingContract)"),
+                keccak256(bytes(name)),
+                keccak256(bytes("1")),
+                block.chainid,
+                address(this)
+            )
+        );
+    }
+
+    function transfer(address _to, uint256 _value) public returns (bool success) {
+        require(balanceOf[msg.sender] >= _value, "Insufficient balance.");
+        balanceOf[msg.sender] -= _value;
+        balanceOf[_to] += _value;
+        emit Transfer(msg.sender, _to, _value);
+        return true;
+    }
+
+    function approve(address _spender, uint256 _value) public returns (bool success) {
+        allowance[msg.sender][_spender] = _value;
+        emit Approval(msg.sender, _spender, _value);
+        return true;
+    }
+
+    function transferFrom(address _from, address _to, uint256 _value) public returns (bool success) {
+        require(balanceOf[_from] >= _value, "Insufficient balance.");
+        require(allowance[_from][msg.sender] >= _value, "Allowance exceeded.");
+
+        balanceOf[_from] -= _value;
+        balanceOf[_to] += _value;
+        allowance[_from][msg.sender] -= _value;
+
+        emit Transfer(_from, _to, _value);
+        return true;
+    }
+
+    function permit(
+        address _owner,
+        address _spender,
+        uint256 _value,
+        uint256 _nonce,
+        uint256 _deadline,
+        uint8 _v,
+        bytes32 _r,
+        bytes32 _s
+    ) public {
+        require(block.timestamp <= _deadline, "Permit expired.");
+        require(!permitNonceUsed[_owner][_nonce], "Permit already used.");
+        address signer = ecrecover(_permitDigest(_owner, _spender, _value, _nonce, _deadline), _v, _r, _s);
+        require(signer != address(0) && signer == _owner, "Invalid permit signature.");
+        permitNonceUsed[_owner][_nonce] = true;
+        allowance[_owner][_spender] = _value;
+        emit Approval(_owner, _spender, _value);
+    }
+
+    function batchTransferFrom(
+        address[] calldata _from,
+        address[] calldata _to,
+        uint256[] calldata _values
+    ) public returns (bool success) {
+        require(_from.length == _to.length && _to.length == _values.length, "Length mismatch.");
+        for (uint256 i = 0; i < _from.length; i++) {
+            transferFrom(_from[i], _to[i], _values[i]);
+        }
+        return true;
+    }
+
+    // Settles transfers whose owners signed a permit for msg.sender, without
+    // touching allowances. Entries with a bad signature, a used nonce, an
+    // expired deadline or too little balance are skipped and reported with
+    // PermitTransferFailed instead of reverting the whole batch.
+    function batchPermitTransferFrom(PermitTransfer[] calldata _transfers) public returns (uint256 succeeded) {
+        for (uint256 i = 0; i < _transfers.length; i++) {
+            PermitTransfer calldata t = _transfers[i];
+            if (
+                block.timestamp > t.deadline ||
+                permitNonceUsed[t.from][t.nonce] ||
+                balanceOf[t.from] < t.value ||
+                t.from == address(0) ||
+                ecrecover(_permitDigest(t.from, msg.sender, t.value, t.nonce, t.deadline), t.v, t.r, t.s) != t.from
+            ) {
+                emit PermitTransferFailed(t.from, i);
+                continue;
+            }
+            permitNonceUsed[t.from][t.nonce] = true;
+            balanceOf[t.from] -= t.value;
+            balanceOf[t.to] += t.value;
+            emit Transfer(t.from, t.to, t.value);
+            succeeded++;
+        }
+    }
+
+    function _permitDigest(
+        address _owner,
+        address _spender,
+        uint256 _value,
+        uint256 _nonce,
+        uint256 _deadline
+    ) internal view returns (bytes32) {
+        return keccak256(
+            abi.encodePacked(
+                "\x19\x01",
+                DOMAIN_SEPARATOR,
+                keccak256(abi.encode(PERMIT_TYPEHASH, _owner, _spender, _value, _nonce, _deadline))
+            )
+        );
+    }
+
+    function mint(address _to, uint256 _value) public onlyOwner {
+        uint256 valueToMint = _value * (10 ** uint256(decimals));
+        totalSupply += valueToMint;
+        balanceOf[_to] += valueToMint;
+        emit Mint(_to, valueToMint);
+    }
+}
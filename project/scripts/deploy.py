@@ -1,40 +1,36 @@
+import json
 import os
-import re
 import shutil
 
-from brownie import VirtualCurrency, accounts
+from brownie import VirtualCurrency, accounts, web3
 
 # brownie accounts new karabala
 # ganache --hardfork berlin --gasPrice 0
 # brownie run scripts/deploy.py --network development
 
 
-def update_contract_address_in_settings(contract_address):
-    """Update CONTRACT_ADDRESS in settings.py"""
-    # Define the path to settings.py
-    settings_path = os.path.join(
-        os.getcwd(), "djangoProject", "djangoProject", "settings.py"
-    )
-
-    # Read the settings.py file
-    with open(settings_path, "r") as file:
-        settings = file.read()
-
-    # Check if CONTRACT_ADDRESS exists and update or add it
-    if "CONTRACT_ADDRESS" in settings:
-        settings = re.sub(
-            r'CONTRACT_ADDRESS = ".*?"',
-            f'CONTRACT_ADDRESS = "{contract_address}"',
-            settings,
-        )
-    else:
-        settings += f'\nCONTRACT_ADDRESS = "{contract_address}"\n'
-
-    # Write the updated content back to settings.py
-    with open(settings_path, "w") as file:
-        file.write(settings)
+def write_manifest(contract, account, **extra):
+    """
+    Write build/chain_manifest.json, which Django reads the contract
+    address and ABI from, and copy it next to the Django project.
+    """
+    manifest = {
+        "contract_address": contract.address,
+        "abi": contract.abi,
+        "chain_id": web3.eth.chain_id,
+        "owner_address": account.address,
+        "block_number": web3.eth.block_number,
+        **extra,
+    }
+    manifest_path = os.path.join(os.getcwd(), "build", "chain_manifest.json")
+    with open(manifest_path, "w") as file:
+        json.dump(manifest, file, indent=2)
+
+    target_dir = os.path.join(os.getcwd(), "djangoProject", "build")
+    os.makedirs(target_dir, exist_ok=True)
+    shutil.copy(manifest_path, os.path.join(target_dir, "chain_manifest.json"))
 
-    print(f"Updated CONTRACT_ADDRESS in settings.py to: {contract_address}")
+    print(f"Wrote {manifest_path}")
 
 
 def move_contract_json():
@@ -54,8 +50,8 @@ def move_contract_json():
     print(f"Moved {source_path} to {target_path}")
 
 
-def main():
-    # Load the account
+def deploy():
+    """Fund the owner account, deploy the contract and mint the initial supply."""
     password = os.getenv("BROWNIE_PASSWORD", "!@#")
     if not password:
         raise ValueError("Environment variable BROWNIE_PASSWORD is not set.")
@@ -73,9 +69,14 @@ def main():
     print(f"Owner's Private Key: {account.private_key}")
     print(f"Owner's Balance: {owner_balance / 10**18} VC")
     print(f"Contract Address: {contract.address}")
+    return account, contract
+
+
+def main():
+    account, contract = deploy()
 
-    # Update settings.py with the contract address
-    update_contract_address_in_settings(contract.address)
+    # Record the deployment for Django
+    write_manifest(contract, account)
 
     # Move the contract JSON file to the Django project
     move_contract_json()
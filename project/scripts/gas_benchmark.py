@@ -0,0 +1,64 @@
+import json
+import os
+
+from brownie import VirtualCurrency, VirtualCurrencyLegacy, accounts, web3
+
+# ganache --hardfork berlin --gasPrice 0
+# brownie run scripts/gas_benchmark.py --network development
+
+
+def measure(contract_class, owner, spender, holder, recipient):
+    """Deploys a contract and returns the gas used by each measured call."""
+    contract = contract_class.deploy(1000000, {"from": owner})
+    gas = {"deploy": contract.tx.gas_used}
+
+    # The first transfer to an address writes a fresh balance slot; later
+    # ones only update it, which is the common case for existing users.
+    gas["transfer (new recipient)"] = contract.transfer(
+        holder, 1000 * 10**18, {"from": owner}
+    ).gas_used
+    gas["transfer"] = contract.transfer(holder, 10**18, {"from": owner}).gas_used
+    gas["approve"] = contract.approve(spender, 100 * 10**18, {"from": holder}).gas_used
+    gas["transferFrom"] = contract.transferFrom(
+        holder, recipient, 10**18, {"from": spender}
+    ).gas_used
+    gas["mint (new recipient)"] = contract.mint(
+        accounts[4], 10, {"from": owner}
+    ).gas_used
+    gas["mint"] = contract.mint(recipient, 10, {"from": owner}).gas_used
+    return gas
+
+
+def main():
+    owner, spender, holder, recipient = (
+        accounts[0],
+        accounts[1],
+        accounts[2],
+        accounts[3],
+    )
+    before = measure(VirtualCurrencyLegacy, owner, spender, holder, recipient)
+    after = measure(VirtualCurrency, owner, spender, holder, recipient)
+    block_gas_limit = web3.eth.get_block("latest").gasLimit
+
+    report = {"block_gas_limit": block_gas_limit, "calls": {}}
+    print(f"{'call':<26}{'before':>10}{'after':>10}{'saved':>9}{'tx/block':>18}")
+    for call in before:
+        saved = before[call] - after[call]
+        per_block = (block_gas_limit // before[call], block_gas_limit // after[call])
+        report["calls"][call] = {
+            "before": before[call],
+            "after": after[call],
+            "saved": saved,
+            "saved_percent": round(100 * saved / before[call], 2),
+            "per_block_before": per_block[0],
+            "per_block_after": per_block[1],
+        }
+        print(
+            f"{call:<26}{before[call]:>10}{after[call]:>10}{saved:>9}"
+            f"{per_block[0]:>9} -> {per_block[1]:<6}"
+        )
+
+    os.makedirs("reports", exist_ok=True)
+    with open(os.path.join("reports", "gas_benchmark.json"), "w") as f:
+        json.dump(report, f, indent=2)
+    print("Wrote reports/gas_benchmark.json")
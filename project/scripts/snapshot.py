@@ -0,0 +1,60 @@
+import os
+import random
+
+from brownie import web3
+from eth_account import Account
+
+from scripts.deploy import deploy, move_contract_json, write_manifest
+
+# ganache --hardfork berlin --gasPrice 0 --database.dbPath /data/chain
+# SNAPSHOT_USERS=1000 brownie run scripts/snapshot.py --network development
+# cd djangoProject && python manage.py restore_chain
+
+
+def fund_users(contract, account, count, password):
+    """Create `count` wallets and mint each of them 100-1000 VC."""
+    users = []
+    transactions = []
+    for i in range(count):
+        wallet = Account.create()
+        amount = random.randint(100, 1000)
+        # Don't wait for each mint; they are mined in order.
+        transactions.append(
+            contract.mint(
+                wallet.address, amount, {"from": account, "required_confs": 0}
+            )
+        )
+        users.append(
+            {
+                "username": f"user{i}",
+                "password": password,
+                "wallet_address": wallet.address,
+                "private_key": wallet.key.hex(),
+                "amount": amount * 10**18,
+            }
+        )
+    if transactions:
+        transactions[-1].wait(1)
+    return users
+
+
+def main():
+    account, contract = deploy()
+    users = fund_users(
+        contract,
+        account,
+        int(os.getenv("SNAPSHOT_USERS", "100")),
+        os.getenv("SNAPSHOT_PASSWORD", "password"),
+    )
+
+    snapshot_id = web3.provider.make_request("evm_snapshot", [])["result"]
+    write_manifest(
+        contract,
+        account,
+        snapshot_id=snapshot_id,
+        ganache_db=os.getenv("GANACHE_DB_PATH"),
+        users=users,
+    )
+    move_contract_json()
+
+    print(f"Funded {len(users)} users and saved snapshot {snapshot_id}")